@@ -9,6 +9,13 @@ import click
 @click.option("--embedder", help="Embedder to generate embeddings", type=str)
 @click.option("--embeddings_dimension", help="Embeddings dimensions to generate region embeddings", type=int)
 @click.option("--h3_resolution", help="H3 resolution for region embeddings", type=int)
+@click.option(
+    "--checkins_format",
+    default="csv",
+    help="Format of the intermediate checkins",
+    show_default=True,
+    type=click.Choice(["csv", "parquet"]),
+)
 @click.pass_context
 def cli(
     ctx,
@@ -17,6 +24,7 @@ def cli(
     embedder: str,
     embeddings_dimension: int,
     h3_resolution: int,
+    checkins_format: str,
 ):
     import json
 
@@ -33,6 +41,7 @@ def cli(
     ctx.obj["embedder"] = embedder
     ctx.obj["embeddings_dimension"] = embeddings_dimension
     ctx.obj["h3_resolution"] = h3_resolution
+    ctx.obj["checkins_format"] = checkins_format
 
 
 @cli.command()
@@ -60,9 +69,27 @@ def mlflow(ctx):
 
 
 @cli.command()
+@click.option(
+    "--matrices_format",
+    default="csv",
+    help="Format of the users matrices generated by model_inputs",
+    show_default=True,
+    type=click.Choice(["csv", "binary"]),
+)
+@click.option("--lazy", is_flag=True, help="Parse each user's csv matrices only when preprocessing reaches it")
+@click.option(
+    "--embeddings_format",
+    default="csv",
+    help="Format of the user embeddings generated by user_embeddings",
+    show_default=True,
+    type=click.Choice(["csv", "binary"]),
+)
 @click.pass_context
-def model(ctx):
+def model(ctx, matrices_format: str, lazy: bool, embeddings_format: str):
     """Execute model for a given state"""
+    if lazy and matrices_format == "binary":
+        raise click.BadOptionUsage("lazy", "--lazy only applies to --matrices_format csv")
+
     from havana.model.job.poi_categorization_job import PoiCategorizationJob
 
     state = ctx.obj["state"]
@@ -87,12 +114,40 @@ def model(ctx):
         embeddings_dimension=embeddings_dimension,
         h3_resolution=h3_resolution,
         metadata=metadata,
+        matrices_format=matrices_format,
+        lazy=lazy,
+        embeddings_format=embeddings_format,
     )
 
 
 @cli.command()
+@click.option("--columnar", is_flag=True, help="Generate all users matrices in a single columnar pass")
+@click.option(
+    "--workers",
+    default=1,
+    help="Processes generating the users matrices",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--lt_chunk_size", help="Check-ins per chunk when building the location time matrix", type=click.IntRange(min=1)
+)
+@click.option(
+    "--matrices_format",
+    default="csv",
+    help="Format of the users matrices files",
+    show_default=True,
+    type=click.Choice(["csv", "binary"]),
+)
+@click.option(
+    "--csv_buffer_size",
+    default=100,
+    help="Users buffered before writing the csv matrices",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
 @click.pass_context
-def model_inputs(ctx):
+def model_inputs(ctx, columnar: bool, workers: int, lt_chunk_size: int, matrices_format: str, csv_buffer_size: int):
     """Generate model default inputs for poi categorization"""
     from havana.model_preprocess.job.matrix_generation_for_poi_categorization_job import (
         MatrixGenerationForPoiCategorizationJob,
@@ -100,14 +155,31 @@ def model_inputs(ctx):
 
     state = ctx.obj["state"]
     metadata = ctx.obj["metadata"]
+    checkins_format = ctx.obj["checkins_format"]
     logging.info(f"Starting model default inputs generation for {state} state")
-    MatrixGenerationForPoiCategorizationJob().run(state, metadata)
+    MatrixGenerationForPoiCategorizationJob().run(
+        state, metadata, columnar, workers, lt_chunk_size, matrices_format, csv_buffer_size, checkins_format
+    )
     logging.info("Successfully generated model inputs")
 
 
 @cli.command
+@click.option(
+    "--embeddings_format",
+    default="csv",
+    help="Format of the user embeddings files",
+    show_default=True,
+    type=click.Choice(["csv", "binary"]),
+)
+@click.option(
+    "--embeddings_lookup",
+    default="checkin",
+    help="Region embedding per checkin or per visited place of each user",
+    show_default=True,
+    type=click.Choice(["checkin", "place"]),
+)
 @click.pass_context
-def user_embeddings(ctx):
+def user_embeddings(ctx, embeddings_format: str, embeddings_lookup: str):
     """Generate user embeddings for a given state and dimension"""
     from havana.embeddings.EmbeddingsPreProcess import EmbeddingsPreProcess
 
@@ -116,18 +188,52 @@ def user_embeddings(ctx):
     embedder = ctx.obj["embedder"]
     h3_resolution = ctx.obj["h3_resolution"]
     metadata = ctx.obj["metadata"]
+    checkins_format = ctx.obj["checkins_format"]
 
     logging.info(f"Generating user embeddings for {state} state.")
     logging.info(
         f"User Embeddings Params: {embedder} embedder, {h3_resolution} resolution, {embeddings_dimension} dimensions"
     )
-    EmbeddingsPreProcess(state, embeddings_dimension, embedder, h3_resolution, metadata).run()
+    EmbeddingsPreProcess(
+        state,
+        embeddings_dimension,
+        embedder,
+        h3_resolution,
+        metadata,
+        embeddings_format,
+        embeddings_lookup,
+        checkins_format,
+    ).run()
     logging.info("Successfully generated user embeddings")
 
 
 @cli.command
+@click.option("--resolutions", required=True, multiple=True, help="H3 resolutions to cache", type=int)
+@click.pass_context
+def h3_cells(ctx, resolutions: tuple[int, ...]):
+    """Cache the H3 cells of the checkins coordinates for a given state and resolutions"""
+    from havana.embeddings.H3CellCache import H3CellCache
+
+    state = ctx.obj["state"]
+    metadata = ctx.obj["metadata"]
+    checkins_format = ctx.obj["checkins_format"]
+
+    logging.info(f"Caching H3 cells for {state} state.")
+    logging.info(f"H3 Cells Params: {list(resolutions)} resolutions")
+    H3CellCache(state, metadata, checkins_format).precompute(list(resolutions))
+    logging.info("Successfully cached H3 cells")
+
+
+@cli.command
+@click.option(
+    "--boundary_source",
+    default="geocode",
+    help="Source of the state area, the local TIGER shapefiles or geocoding",
+    show_default=True,
+    type=click.Choice(["tiger", "geocode"]),
+)
 @click.pass_context
-def embedder(ctx):
+def embedder(ctx, boundary_source: str):
     """Generate embeddings for a given embedder, state, dimension and h3 resolution"""
     from havana.embeddings.GeoVex import GeoVex
     from havana.embeddings.Hex2Vec import Hex2Vec
@@ -146,6 +252,7 @@ def embedder(ctx):
         "embeddings_dimension": embeddings_dimension,
         "h3_resolution": h3_resolution,
         "metadata": metadata,
+        "boundary_source": boundary_source,
     }
 
     if embedder == "hex2vec":
@@ -157,22 +264,106 @@ def embedder(ctx):
     logging.info(f"Successfully generated {embedder.upper()} embeddings")
 
 
+@cli.command
+@click.option("--dimensions", required=True, multiple=True, help="Embeddings dimensions to generate", type=int)
+@click.option("--resolutions", required=True, multiple=True, help="H3 resolutions to generate", type=int)
+@click.option(
+    "--boundary_source",
+    default="tiger",
+    help="Source of the state area, the local TIGER shapefiles or geocoding",
+    show_default=True,
+    type=click.Choice(["tiger", "geocode"]),
+)
+@click.option(
+    "--workers",
+    default=1,
+    help="Processes fitting the dimensions of a resolution",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.pass_context
+def sweep(ctx, dimensions: tuple[int, ...], resolutions: tuple[int, ...], boundary_source: str, workers: int):
+    """Generate embeddings for a given embedder and state for every dimension and h3 resolution"""
+    from havana.embeddings.EmbeddingsSweep import EmbeddingsSweep
+
+    embedder = ctx.obj["embedder"]
+    state = ctx.obj["state"]
+    metadata = ctx.obj["metadata"]
+
+    logging.info(f"Sweeping {embedder.upper()} embeddings to {state} state.")
+    logging.info(f"{embedder.upper()} Params: {list(resolutions)} resolutions, {list(dimensions)} dimensions")
+    EmbeddingsSweep(embedder, state, list(dimensions), list(resolutions), metadata, boundary_source, workers).run()
+    logging.info(f"Successfully swept {embedder.upper()} embeddings")
+
+
 @cli.command()
+@click.option(
+    "--chunk_size",
+    help="Checkins per chunk to stream the raw checkins, read at once if not set",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--engine",
+    default="pandas",
+    help="Dataframe engine of the preprocessing",
+    show_default=True,
+    type=click.Choice(["pandas", "polars"]),
+)
 @click.pass_context
 def preprocess(
     ctx,
+    chunk_size: int,
+    engine: str,
 ):
     """Preprocess checkins data for a given state"""
     from havana.preprocess.CheckinsPreProcess import CheckinsPreProcess
 
     state = ctx.obj["state"]
     metadata = ctx.obj["metadata"]
+    checkins_format = ctx.obj["checkins_format"]
     logging.info("Starting checkins preprocessing")
     logging.info(f"Preprocessing for {state} state")
-    (CheckinsPreProcess(state, metadata).run())
+    (CheckinsPreProcess(state, metadata, chunk_size, checkins_format, engine).run())
     logging.info("Successfully preprocessed checkins data")
 
 
+@cli.command()
+@click.pass_context
+def assign_states(ctx):
+    """Assign the state of the checkins from the states boundaries, joining only places not assigned yet"""
+    from havana.preprocess.StatesAssignment import StatesAssignment
+
+    metadata = ctx.obj["metadata"]
+    logging.info("Starting checkins states assignment")
+    StatesAssignment(metadata).run()
+    logging.info("Successfully assigned checkins states")
+
+
+@cli.command()
+@click.option("--states", multiple=True, help="States to preprocess, all the states if --state is all", type=str)
+@click.option(
+    "--workers",
+    default=1,
+    help="Processes formatting and writing the states",
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.pass_context
+def preprocess_states(ctx, states: tuple[str, ...], workers: int):
+    """Preprocess checkins data for several states in one pass over the geo-joined checkins"""
+    from havana.preprocess.StatesCheckinsPreProcess import StatesCheckinsPreProcess
+
+    state = ctx.obj["state"]
+    metadata = ctx.obj["metadata"]
+    checkins_format = ctx.obj["checkins_format"]
+    if not states:
+        states = None if state == "all" else [state]
+    logging.info("Starting states checkins preprocessing")
+    logging.info(f"Preprocessing for {'all' if states is None else list(states)} states")
+    StatesCheckinsPreProcess(metadata, None if states is None else list(states), workers, checkins_format).run()
+    logging.info("Successfully preprocessed states checkins data")
+
+
 def main():
     cli(obj={})
 
@@ -1,8 +1,30 @@
 import logging
+import os
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import NamedTuple
 
+import geopandas as gpd
 import pandas as pd
+from shapely.geometry.base import BaseGeometry
+from srai.joiners import IntersectionJoiner
+from srai.loaders import OSMPbfLoader
+from srai.neighbourhoods import H3Neighbourhood
+from srai.regionalizers import geocode_to_region_gdf
+
+from havana.embeddings.OSMCache import OSMCache
+from havana.embeddings.StatesBoundaries import StatesBoundaries
+
+
+class EmbedderRegions(NamedTuple):
+    """
+    Regions of a state and H3 resolution with their OSM features, shared by every embeddings dimension
+    """
+
+    regions_gdf: gpd.GeoDataFrame
+    features_gdf: gpd.GeoDataFrame
+    joint_gdf: gpd.GeoDataFrame
+    neighbourhood: H3Neighbourhood
 
 
 class Embedder(ABC):
@@ -15,26 +37,173 @@ class Embedder(ABC):
         embeddings_dimension (int): Embeddings dimensions
         h3_resolution (int): H3 resolution
         metadata (dict): Metadata for intermediate data
+        boundary_source (str): Source of the state area, "tiger" shapefiles or "geocode"
 
     Functions:
         run: Generate embeddings for a given state
+        _generate_regions: Generate the regions, features, joint and neighbourhood of the H3 resolution
+        _fit_embeddings: Fit the embeddings of the regions
+        _area_source: Source of the state area and the files it is read from
+        _load_area: Load the state area from a local boundary file, the TIGER shapefiles or by geocoding it
+        _read_area: Read the state area through the OSM cache
+        _read_features: Read the OSM features of an area through the OSM cache
+        _read_joint: Read the joint of regions and features through the OSM cache
         _write_embeddings: Write embeddings to intermediate data
     """
 
-    def __init__(self, state: str, embedder_name: str, embeddings_dimension: int, h3_resolution: int, metadata: dict):
+    def __init__(
+        self,
+        state: str,
+        embedder_name: str,
+        embeddings_dimension: int,
+        h3_resolution: int,
+        metadata: dict,
+        boundary_source: str = "geocode",
+    ):
         self.state = state
         self.embedder_name = embedder_name
         self.embeddings_dimension = embeddings_dimension
         self.h3_resolution = h3_resolution
         self.metadata = metadata
+        self.boundary_source = boundary_source
+        self.osm_cache = OSMCache(state, metadata)
 
-    @abstractmethod
     def run(self) -> None:
         """
         Generate embeddings for a given state
         """
+        self._write_embeddings(self._fit_embeddings(self._generate_regions()))
+
+    @abstractmethod
+    def _generate_regions(self) -> EmbedderRegions:
+        """
+        Generate the regions, features, joint and neighbourhood of the H3 resolution
+
+        Returns:
+            EmbedderRegions: Regions of the state
+        """
         pass
 
+    @abstractmethod
+    def _fit_embeddings(self, regions: EmbedderRegions) -> pd.DataFrame:
+        """
+        Fit the embeddings of the regions, for the embeddings dimension
+
+        Args:
+            regions (EmbedderRegions): Regions of the state
+
+        Returns:
+            pd.DataFrame: Embeddings data
+        """
+        pass
+
+    def _area_source(self) -> tuple[str, list[str]]:
+        """
+        Source of the state area: the local boundary file, if there is one, otherwise the TIGER states shapefiles
+        or geocoding, as set by boundary_source
+
+        Returns:
+            tuple[str, list[str]]: Source of the state area and the files it is read from
+        """
+        boundary_path = self.metadata["raw"].get("osm_boundary")
+        if boundary_path is not None and os.path.exists(boundary_path.format(state=self.state)):
+            return "boundary_file", [boundary_path.format(state=self.state)]
+
+        if self.boundary_source == "tiger":
+            shapefile_path = self.metadata["raw"]["states_boundaries"]
+            return "tiger", [shapefile_path, str(Path(shapefile_path).with_suffix(".dbf"))]
+
+        return "geocode", []
+
+    def _load_area(self, source: str, source_files: list[str]) -> gpd.GeoDataFrame:
+        """
+        Load the state area from the local boundary file, the TIGER states shapefiles or by geocoding it
+
+        Args:
+            source (str): Source of the state area
+            source_files (list[str]): Files the state area is read from
+
+        Returns:
+            gpd.GeoDataFrame: State area
+        """
+        if source == "boundary_file":
+            return gpd.read_file(source_files[0])[["geometry"]].to_crs("EPSG:4326")
+
+        if source == "tiger":
+            return StatesBoundaries(self.metadata).boundary(self.state)
+
+        # states names that are also cities names
+        cities_states = ["New York"]
+
+        return (
+            geocode_to_region_gdf(f"{self.state} State, United States")
+            if self.state in cities_states
+            else geocode_to_region_gdf(f"{self.state}, United States")
+        )
+
+    def _read_area(self) -> gpd.GeoDataFrame:
+        """
+        Read the state area through the OSM cache
+
+        Returns:
+            gpd.GeoDataFrame: State area
+        """
+        source, source_files = self._area_source()
+
+        return self.osm_cache.area(lambda: self._load_area(source, source_files), source, source_files)
+
+    def _read_features(
+        self, area: gpd.GeoDataFrame | BaseGeometry, tags: dict, download_source: str | None = None
+    ) -> gpd.GeoDataFrame:
+        """
+        Read the OSM features of an area through the OSM cache. They are loaded from the local PBF file if there is
+        one, otherwise from the download source
+
+        Args:
+            area (gpd.GeoDataFrame | BaseGeometry): Area of the features
+            tags (dict): OSM tags of the features
+            download_source (str | None): OSM extracts source, the loader default if None
+
+        Returns:
+            gpd.GeoDataFrame: Features
+        """
+        if self.osm_cache.pbf_file is not None:
+            loader = OSMPbfLoader(pbf_file=self.osm_cache.pbf_file)
+        elif download_source is not None:
+            loader = OSMPbfLoader(download_source=download_source)
+        else:
+            loader = OSMPbfLoader()
+
+        return self.osm_cache.features(area, tags, lambda: loader.load(area, tags), source=str(download_source))
+
+    def _read_joint(
+        self,
+        regions_gdf: gpd.GeoDataFrame,
+        features_gdf: gpd.GeoDataFrame,
+        tags: dict,
+        download_source: str | None = None,
+    ) -> gpd.GeoDataFrame:
+        """
+        Read the joint of regions and features through the OSM cache
+
+        Args:
+            regions_gdf (gpd.GeoDataFrame): Regions
+            features_gdf (gpd.GeoDataFrame): Features
+            tags (dict): OSM tags of the features
+            download_source (str | None): OSM extracts source the features were read from
+
+        Returns:
+            gpd.GeoDataFrame: Joint, indexed by region and feature
+        """
+        return self.osm_cache.joint(
+            regions_gdf,
+            features_gdf,
+            self.h3_resolution,
+            tags,
+            lambda: IntersectionJoiner().transform(regions_gdf, features_gdf),
+            source=str(download_source),
+        )
+
     def _write_embeddings(self, embeddings: pd.DataFrame) -> None:
         """
         Write embeddings to intermediate data
@@ -2,9 +2,12 @@ import json
 import logging
 from pathlib import Path
 
-import h3
+import numpy as np
 import pandas as pd
 
+from havana.embeddings.H3CellCache import H3CellCache
+from havana.model_preprocess.loader.matrix_store_loader import MatrixStoreLoader
+
 
 class EmbeddingsPreProcess:
     """
@@ -14,23 +17,41 @@ class EmbeddingsPreProcess:
         state (str): State
         embeddings_dimension (int): Embeddings dimension
         embedder (str): Embedder
+        h3_resolution (int): H3 resolution
         metadata (dict): Metadata
+        embeddings_format (str): Format of the user embeddings, "csv" (json per user) or "binary" (float32 store)
+        embeddings_lookup (str): "checkin" for one embedding per checkin or "place" for one per visited place
+        checkins_format (str): Format of the intermediate checkins, "csv" or "parquet"
 
     Functions:
         _read_embeddings: Read embeddings from intermediate data
         _read_checkins: Read checkins data
-        _generate_h3_cell: Generate H3 cell from latitude and longitude
         _generate_user_embeddings: Generate user embeddings from checkins embeddings
+        _generate_user_places: Generate users visited places and their region embeddings
         _write_user_embeddings: Write user embeddings to processed data
+        _write_user_places: Write users visited places and their region embeddings to processed data
         run: Preprocess users embeddings data
     """
 
-    def __init__(self, state: str, embeddings_dimension: int, embedder: str, h3_resolution: int, metadata: dict):
+    def __init__(
+        self,
+        state: str,
+        embeddings_dimension: int,
+        embedder: str,
+        h3_resolution: int,
+        metadata: dict,
+        embeddings_format: str = "csv",
+        embeddings_lookup: str = "checkin",
+        checkins_format: str = "csv",
+    ):
         self.state = state
         self.embeddings_dimension = embeddings_dimension
         self.embedder = embedder
         self.h3_resolution = h3_resolution
         self.metadata = metadata
+        self.embeddings_format = embeddings_format
+        self.embeddings_lookup = embeddings_lookup
+        self.checkins_format = checkins_format
 
     def _read_embeddings(self) -> pd.DataFrame:
         """
@@ -51,24 +72,13 @@ class EmbeddingsPreProcess:
             pd.DataFrame: Checkins data
         """
         path = self.metadata["intermediate"]["checkins"]
-        path = path + f"{self.state}.csv"
-        return pd.read_csv(path).rename(columns={"userid": "user_id"})
-
-    def _generate_h3_cell(self, row: pd.Series) -> str:
-        """
-        Generate H3 cell from latitude and longitude
-
-        Args:
-            row (pd.Series): Row of a DataFrame
-
-        Returns:
-            str: H3 cell
-        """
-        lat = row["latitude"]
-        lon = row["longitude"]
-
-        h3_cell = h3.latlng_to_cell(lat, lon, self.h3_resolution)
-        return h3_cell
+        path = path + f"{self.state}.{self.checkins_format}"
+        columns = ["userid", "placeid", "local_datetime", "latitude", "longitude"]
+        if self.checkins_format == "parquet":
+            checkins_df = pd.read_parquet(path, columns=columns)
+        else:
+            checkins_df = pd.read_csv(path, usecols=columns)
+        return checkins_df.rename(columns={"userid": "user_id"})
 
     def _criar_dicionario(self, n):
         """
@@ -95,35 +105,116 @@ class EmbeddingsPreProcess:
             checkins_embeddings_df (pd.DataFrame): Checkins embeddings data
 
         Returns:
-            pd.DataFrame: User embeddings data
+            pd.DataFrame: User embeddings data, one (checkins, dimension) array per user
         """
-        users = checkins_embeddings_df["user_id"].unique()
-        user_embeddings = pd.DataFrame(columns=["user_id", "embeddings"])
+        user_codes, users = pd.factorize(checkins_embeddings_df["user_id"])
+        feature_cols = checkins_embeddings_df.filter(like="feature").columns.tolist()
 
-        for user in users:
-            user_checkins = checkins_embeddings_df[checkins_embeddings_df["user_id"] == user]
-            feature_cols = checkins_embeddings_df.filter(like="feature").columns.tolist()
-            user_embedding = user_checkins[feature_cols].values
-            user_embedding = json.dumps(user_embedding.tolist())
+        # checkins grouped by user, keeping their order inside each user
+        order = np.argsort(user_codes, kind="stable")
+        features = checkins_embeddings_df[feature_cols].to_numpy()[order]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(user_codes, minlength=len(users)))])
 
-            user_embeddings = pd.concat(
-                [user_embeddings, pd.DataFrame({"user_id": user, "embeddings": [user_embedding]})], ignore_index=True
-            )
+        embeddings = [features[offsets[i] : offsets[i + 1]] for i in range(len(users))]
+
+        return pd.DataFrame({"user_id": users, "embeddings": embeddings})
+
+    def _generate_user_places(
+        self, checkins_df: pd.DataFrame, embeddings_df: pd.DataFrame
+    ) -> tuple[pd.DataFrame, pd.DataFrame, np.ndarray]:
+        """
+        Generate users visited places and their region embeddings. Each user gets its places in the order of
+        their first checkin, as the rows of the users matrices, and each place the row of its H3 cell in the
+        region embeddings. A place checked in from several coordinates takes the cell of its first visit. Places
+        in cells without embedding get the last row, of zeros
+
+        Args:
+            checkins_df (pd.DataFrame): Checkins data, with their H3 cell
+            embeddings_df (pd.DataFrame): Region embeddings data
+
+        Returns:
+            pd.DataFrame: Users places, indexes in the places data
+            pd.DataFrame: Places data, with their H3 cell and region embeddings row
+            np.ndarray: Region embeddings, float32 with shape (regions + 1, dimension)
+        """
+        checkins_df = checkins_df.assign(local_datetime=pd.to_datetime(checkins_df["local_datetime"]))
+        visits_df = checkins_df.sort_values(by=["user_id", "local_datetime"], kind="stable").drop_duplicates(
+            subset=["user_id", "placeid"]
+        )
+
+        place_codes, placeids = pd.factorize(visits_df["placeid"])
+        region_ids = visits_df["region_id"].to_numpy()[np.unique(place_codes, return_index=True)[1]]
+        feature_cols = embeddings_df.filter(like="feature").columns.tolist()
+        regions = np.vstack(
+            [
+                embeddings_df[feature_cols].to_numpy(dtype=np.float32),
+                np.zeros((1, len(feature_cols)), dtype=np.float32),
+            ]
+        )
+        places_regions = pd.Index(embeddings_df["region_id"]).get_indexer(region_ids)
+        places_regions[places_regions == -1] = len(regions) - 1
+        places_df = pd.DataFrame({"placeid": placeids, "region_id": region_ids, "region": places_regions})
+
+        user_codes, users = pd.factorize(visits_df["user_id"])
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(user_codes, minlength=len(users)))])
+        places = [place_codes[offsets[i] : offsets[i + 1]] for i in range(len(users))]
+        user_places_df = pd.DataFrame({"user_id": users, "places": places})
 
-        return user_embeddings
+        return user_places_df, places_df, regions
 
     def _write_user_embeddings(self, user_embeddings_df: pd.DataFrame) -> None:
         """
-        Write user embeddings to processed data
+        Write user embeddings to processed data, as a csv with a json matrix per user or as a binary
+        store with the float32 embeddings of all users in a flat file indexed by user offsets
 
         Args:
             user_embeddings_df (pd.DataFrame): User embeddings data
         """
         path = self.metadata["processed"]["user_embeddings"].format(embedder=self.embedder, state=self.state)
         Path(path).mkdir(parents=True, exist_ok=True)
-        path = path + f"{self.embeddings_dimension}_dimension_{self.h3_resolution}_resolution.csv"
+        path = path + f"{self.embeddings_dimension}_dimension_{self.h3_resolution}_resolution"
         logging.info("Writing user embeddings to processed data")
-        user_embeddings_df.to_csv(path, index=False, sep=",")
+        if self.embeddings_format == "binary":
+            path = path + "/"
+            store = MatrixStoreLoader(path)
+            for user_id, embeddings in zip(user_embeddings_df["user_id"], user_embeddings_df["embeddings"]):
+                store.append(user_id, {"embeddings": embeddings.astype(np.float32)})
+            store.close()
+        else:
+            path = path + ".csv"
+            user_embeddings_df.assign(
+                embeddings=[json.dumps(embeddings.tolist()) for embeddings in user_embeddings_df["embeddings"]]
+            ).to_csv(path, index=False, sep=",")
+        logging.info(f"Path: {path}")
+
+    def _write_user_places(self, user_places_df: pd.DataFrame, places_df: pd.DataFrame, regions: np.ndarray) -> None:
+        """
+        Write users visited places and their region embeddings to processed data. The binary format keeps the
+        place -> H3 cell -> embedding indirection (places store, places.parquet and regions.npy), the csv
+        format expands it to a json matrix per user
+
+        Args:
+            user_places_df (pd.DataFrame): Users places, indexes in the places data
+            places_df (pd.DataFrame): Places data, with their H3 cell and region embeddings row
+            regions (np.ndarray): Region embeddings
+        """
+        if self.embeddings_format != "binary":
+            places_regions = places_df["region"].to_numpy()
+            user_embeddings_df = user_places_df.assign(
+                embeddings=[regions[places_regions[places]] for places in user_places_df["places"]]
+            ).drop(columns=["places"])
+            self._write_user_embeddings(user_embeddings_df)
+            return
+
+        path = self.metadata["processed"]["user_embeddings"].format(embedder=self.embedder, state=self.state)
+        path = path + f"{self.embeddings_dimension}_dimension_{self.h3_resolution}_resolution/"
+        logging.info("Writing user places embeddings to processed data")
+        store = MatrixStoreLoader(path)
+        for user_id, places in zip(user_places_df["user_id"], user_places_df["places"]):
+            store.append(user_id, {"places": places.astype(np.int64)})
+        store.close()
+        places_df.to_parquet(path + "places.parquet", index=False)
+        np.save(path + "regions.npy", regions)
         logging.info(f"Path: {path}")
 
     def run(self):
@@ -133,10 +224,20 @@ class EmbeddingsPreProcess:
         embeddings_df = self._read_embeddings().reset_index()
         checkins_df = self._read_checkins()
 
-        checkins_df["region_id"] = checkins_df.apply(self._generate_h3_cell, axis=1)
+        coordinates_cells = H3CellCache(self.state, self.metadata, self.checkins_format).cells(self.h3_resolution)
+        coordinates = pd.MultiIndex.from_frame(checkins_df[["latitude", "longitude"]])
+        checkins_df["region_id"] = coordinates_cells.reindex(coordinates).to_numpy()
+        checkins_df = checkins_df.drop(columns=["latitude", "longitude"])
 
         rename_columns = self._criar_dicionario(self.embeddings_dimension)
 
+        if self.embeddings_lookup == "place":
+            user_places_df, places_df, regions = self._generate_user_places(
+                checkins_df, embeddings_df.rename(columns=rename_columns)
+            )
+            self._write_user_places(user_places_df, places_df, regions)
+            return
+
         checkins_embeddings_df = (
             checkins_df.merge(embeddings_df, on="region_id").rename(columns=rename_columns).sort_values(by=["user_id"])
         )
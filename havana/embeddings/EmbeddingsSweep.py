@@ -0,0 +1,120 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from havana.embeddings.Embedder import Embedder, EmbedderRegions
+from havana.embeddings.GeoVex import GeoVex
+from havana.embeddings.Hex2Vec import Hex2Vec
+
+EMBEDDERS = {"hex2vec": Hex2Vec, "geovex": GeoVex}
+
+# regions of the resolution being swept, set once per worker process
+_worker_regions = None
+
+
+def _init_worker(regions: EmbedderRegions) -> None:
+    """
+    Keep the regions of the resolution in the worker process, so they are only sent once to it
+
+    Args:
+        regions (EmbedderRegions): Regions of the state
+    """
+    global _worker_regions
+    _worker_regions = regions
+
+
+def _fit_dimension(embedder: Embedder) -> int:
+    """
+    Fit and write the embeddings of an embeddings dimension from the worker regions
+
+    Args:
+        embedder (Embedder): Embedder of the dimension and resolution
+
+    Returns:
+        int: Embeddings dimension
+    """
+    embedder._write_embeddings(embedder._fit_embeddings(_worker_regions))
+
+    return embedder.embeddings_dimension
+
+
+class EmbeddingsSweep:
+    """
+    Region embeddings of a state for every pair of embeddings dimensions and H3 resolutions. The regions, features,
+    joint and neighbourhood are generated once per resolution and each dimension is fitted from them, writing the
+    same embeddings files as the embedder run
+
+    Args:
+        embedder_name (str): Embedder name, "hex2vec" or "geovex"
+        state (str): State to generate embeddings
+        embeddings_dimensions (list[int]): Embeddings dimensions
+        h3_resolutions (list[int]): H3 resolutions
+        metadata (dict): Metadata dictionary
+        boundary_source (str): Source of the state area, "tiger" shapefiles or "geocode"
+        workers (int): Processes fitting the dimensions of a resolution
+
+    Functions:
+        _embedder: Embedder of a dimension and resolution
+        run: Run embeddings generation for every dimension and resolution
+    """
+
+    def __init__(
+        self,
+        embedder_name: str,
+        state: str,
+        embeddings_dimensions: list[int],
+        h3_resolutions: list[int],
+        metadata: dict,
+        boundary_source: str = "tiger",
+        workers: int = 1,
+    ):
+        self.embedder_name = embedder_name
+        self.state = state
+        self.embeddings_dimensions = embeddings_dimensions
+        self.h3_resolutions = h3_resolutions
+        self.metadata = metadata
+        self.boundary_source = boundary_source
+        self.workers = workers
+
+    def _embedder(self, embeddings_dimension: int, h3_resolution: int) -> Embedder:
+        """
+        Embedder of a dimension and resolution
+
+        Args:
+            embeddings_dimension (int): Embeddings dimension
+            h3_resolution (int): H3 resolution
+
+        Returns:
+            Embedder: Embedder
+        """
+        embedder_params = {
+            "state": self.state,
+            "embeddings_dimension": embeddings_dimension,
+            "h3_resolution": h3_resolution,
+            "metadata": self.metadata,
+            "boundary_source": self.boundary_source,
+        }
+
+        return EMBEDDERS[self.embedder_name](**embedder_params)
+
+    def run(self) -> None:
+        """
+        Run embeddings generation for every dimension and resolution
+        """
+        for h3_resolution in self.h3_resolutions:
+            logging.info(f"Generating {self.embedder_name.upper()} regions for {h3_resolution} resolution")
+            regions = self._embedder(self.embeddings_dimensions[0], h3_resolution)._generate_regions()
+            embedders = [self._embedder(dimension, h3_resolution) for dimension in self.embeddings_dimensions]
+
+            if self.workers > 1:
+                with ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker, initargs=(regions,)
+                ) as executor:
+                    futures = [executor.submit(_fit_dimension, embedder) for embedder in embedders]
+                    for future in futures:
+                        logging.info(f"Generated {future.result()} dimensions, {h3_resolution} resolution embeddings")
+            else:
+                for embedder in embedders:
+                    embedder._write_embeddings(embedder._fit_embeddings(regions))
+                    logging.info(
+                        f"Generated {embedder.embeddings_dimension} dimensions, {h3_resolution} resolution embeddings"
+                    )
@@ -1,17 +1,18 @@
 import logging
 import warnings
 
+import pandas as pd
 import torch
 from pytorch_lightning import seed_everything
 from srai.embedders import GeoVexEmbedder
 from srai.h3 import ring_buffer_h3_regions_gdf
-from srai.joiners import IntersectionJoiner
-from srai.loaders import OSMPbfLoader
 from srai.loaders.osm_loaders.filters import GEOFABRIK_LAYERS
 from srai.neighbourhoods import H3Neighbourhood
-from srai.regionalizers import H3Regionalizer, geocode_to_region_gdf
+from srai.regionalizers import H3Regionalizer
 
-from havana.embeddings.Embedder import Embedder
+from havana.embeddings.Embedder import Embedder, EmbedderRegions
+
+K_RING_BUFFER_RADIUS = 4
 
 
 class GeoVex(Embedder):
@@ -23,61 +24,76 @@ class GeoVex(Embedder):
         embeddings_dimension (int): Embeddings dimensions
         h3_resolution (int): H3 resolution
         metadata (dict): Metadata dictionary
+        boundary_source (str): Source of the state area, "tiger" shapefiles or "geocode"
 
     Functions:
-        run: Run embeddings generation
+        _generate_regions: Generate the buffered H3 regions, OSM features, joint and neighbourhood
+        _fit_embeddings: Fit GeoVex embeddings
     """
 
-    def __init__(self, state: str, embeddings_dimension: int, h3_resolution: int, metadata: dict):
+    def __init__(
+        self,
+        state: str,
+        embeddings_dimension: int,
+        h3_resolution: int,
+        metadata: dict,
+        boundary_source: str = "geocode",
+    ):
         super().__init__(
             state=state,
             embedder_name="geovex",
             embeddings_dimension=embeddings_dimension,
             h3_resolution=h3_resolution,
             metadata=metadata,
+            boundary_source=boundary_source,
         )
 
-    def run(self) -> None:
-        """
-        Generate GeoVex embeddings for a given state
+    def _generate_regions(self) -> EmbedderRegions:
         """
-        SEED = 71
-        seed_everything(SEED)
-
-        # states names that are also cities names
-        cities_states = ["New York"]
+        Generate the buffered H3 regions of the state area, their OSM features, joint and neighbourhood
 
+        Returns:
+            EmbedderRegions: Regions of the state
+        """
         logging.info("Generating area GDF")
-        area_gdf = (
-            geocode_to_region_gdf(f"{self.state} State, United States")
-            if self.state in cities_states
-            else geocode_to_region_gdf(f"{self.state}, United States")
-        )
+        area_gdf = self._read_area()
 
-        k_ring_buffer_radius = 4
         logging.info("Generating regionalizer and base H3 regions")
         regionalizer = H3Regionalizer(resolution=self.h3_resolution)
         base_h3_regions = regionalizer.transform(area_gdf)
         logging.info("Generating buffered H3 regions")
-        buffered_h3_regions = ring_buffer_h3_regions_gdf(base_h3_regions, distance=k_ring_buffer_radius)
+        buffered_h3_regions = ring_buffer_h3_regions_gdf(base_h3_regions, distance=K_RING_BUFFER_RADIUS)
         buffered_h3_geometry = buffered_h3_regions.unary_union
 
         tags = GEOFABRIK_LAYERS
-        loader = OSMPbfLoader()
         logging.info("Loading features")
-        features_gdf = loader.load(buffered_h3_geometry, tags)
+        features_gdf = self._read_features(buffered_h3_geometry, tags)
 
         logging.info("Joining features")
-        joiner = IntersectionJoiner()
-        joint_gdf = joiner.transform(buffered_h3_regions, features_gdf)
+        joint_gdf = self._read_joint(buffered_h3_regions, features_gdf, tags)
 
         logging.info("Generating neighbourhood")
         neighbourhood = H3Neighbourhood(buffered_h3_regions)
 
+        return EmbedderRegions(buffered_h3_regions, features_gdf, joint_gdf, neighbourhood)
+
+    def _fit_embeddings(self, regions: EmbedderRegions) -> pd.DataFrame:
+        """
+        Fit GeoVex embeddings of the regions
+
+        Args:
+            regions (EmbedderRegions): Regions of the state
+
+        Returns:
+            pd.DataFrame: Embeddings data
+        """
+        SEED = 71
+        seed_everything(SEED)
+
         embedder = GeoVexEmbedder(
             target_features=GEOFABRIK_LAYERS,
             batch_size=10,
-            neighbourhood_radius=k_ring_buffer_radius,
+            neighbourhood_radius=K_RING_BUFFER_RADIUS,
             convolutional_layers=2,
             embedding_size=self.embeddings_dimension,
         )
@@ -87,10 +103,10 @@ class GeoVex(Embedder):
             warnings.simplefilter("ignore")
 
             embeddings = embedder.fit_transform(
-                regions_gdf=buffered_h3_regions,
-                features_gdf=features_gdf,
-                joint_gdf=joint_gdf,
-                neighbourhood=neighbourhood,
+                regions_gdf=regions.regions_gdf,
+                features_gdf=regions.features_gdf,
+                joint_gdf=regions.joint_gdf,
+                neighbourhood=regions.neighbourhood,
                 trainer_kwargs={
                     # "max_epochs": 20, # uncomment for a longer training
                     "max_epochs": 5,
@@ -99,4 +115,4 @@ class GeoVex(Embedder):
                 learning_rate=0.001,
             )
 
-        self._write_embeddings(embeddings)
+        return embeddings
@@ -0,0 +1,122 @@
+import logging
+import os
+
+import h3
+import numpy as np
+import pandas as pd
+
+
+class H3CellCache:
+    """
+    Persistent coordinates -> H3 cell index of a state's checkins, for several resolutions. It is stored next to the
+    intermediate checkins, one file per checkins format, and rebuilt when the checkins are newer than it. Cells are
+    indexed per distinct coordinate rather than per place, as a place may be checked in from several coordinates,
+    and each resolution is indexed from the coordinates: the H3 parent of a cell is not always the coarser cell
+    containing the point
+
+    Args:
+        state (str): State
+        metadata (dict): Metadata
+        checkins_format (str): Format of the intermediate checkins, "csv" or "parquet"
+
+    Functions:
+        _read_coordinates: Read the distinct coordinates from intermediate checkins data
+        _read_cache: Read the cached H3 cells
+        _write_cache: Write the cached H3 cells
+        _generate_cells: Generate H3 cells from latitudes and longitudes
+        cells: H3 cell of each coordinate for a resolution
+        precompute: Cache the H3 cells of several resolutions
+    """
+
+    def __init__(self, state: str, metadata: dict, checkins_format: str = "csv"):
+        self.state = state
+        self.metadata = metadata
+        self.checkins_format = checkins_format
+        self.checkins_path = self.metadata["intermediate"]["checkins"] + f"{self.state}.{self.checkins_format}"
+        self.path = self.metadata["intermediate"]["checkins"] + f"{self.state}_{self.checkins_format}_h3_cells.parquet"
+
+    def _read_coordinates(self) -> pd.DataFrame:
+        """
+        Read the distinct coordinates from intermediate checkins data
+
+        Returns:
+            pd.DataFrame: Distinct latitudes and longitudes of the checkins
+        """
+        columns = ["latitude", "longitude"]
+        if self.checkins_format == "parquet":
+            coordinates_df = pd.read_parquet(self.checkins_path, columns=columns)
+        else:
+            coordinates_df = pd.read_csv(self.checkins_path, usecols=columns)
+        return coordinates_df.drop_duplicates(ignore_index=True)
+
+    def _read_cache(self) -> pd.DataFrame | None:
+        """
+        Read the cached H3 cells
+
+        Returns:
+            pd.DataFrame | None: Cached coordinates and their H3 cells, None if there is no valid cache
+        """
+        if not os.path.exists(self.path) or os.path.getmtime(self.path) < os.path.getmtime(self.checkins_path):
+            return None
+        return pd.read_parquet(self.path)
+
+    def _write_cache(self, cache_df: pd.DataFrame) -> None:
+        """
+        Write the cached H3 cells
+
+        Args:
+            cache_df (pd.DataFrame): Cached coordinates and their H3 cells
+        """
+        cache_df.to_parquet(self.path, index=False)
+        logging.info(f"H3 cells cache: {self.path}")
+
+    def _generate_cells(self, latitudes: np.ndarray, longitudes: np.ndarray, resolution: int) -> np.ndarray:
+        """
+        Generate H3 cells from latitudes and longitudes
+
+        Args:
+            latitudes (np.ndarray): Latitudes
+            longitudes (np.ndarray): Longitudes
+            resolution (int): H3 resolution
+
+        Returns:
+            np.ndarray: H3 cells
+        """
+        return np.array(
+            [h3.latlng_to_cell(lat, lon, resolution) for lat, lon in zip(latitudes, longitudes)], dtype=object
+        )
+
+    def cells(self, resolution: int) -> pd.Series:
+        """
+        H3 cell of each coordinate for a resolution, computed and cached if needed
+
+        Args:
+            resolution (int): H3 resolution
+
+        Returns:
+            pd.Series: H3 cells indexed by latitude and longitude
+        """
+        return self.precompute([resolution])[f"resolution_{resolution}"]
+
+    def precompute(self, resolutions: list[int]) -> pd.DataFrame:
+        """
+        Cache the H3 cells of several resolutions, writing the cache once for the missing ones
+
+        Args:
+            resolutions (list[int]): H3 resolutions
+
+        Returns:
+            pd.DataFrame: Cached H3 cells indexed by latitude and longitude, a column per resolution
+        """
+        cache_df = self._read_cache()
+        if cache_df is None:
+            cache_df = self._read_coordinates()
+        missing_resolutions = [r for r in resolutions if f"resolution_{r}" not in cache_df.columns]
+        for resolution in missing_resolutions:
+            cache_df[f"resolution_{resolution}"] = self._generate_cells(
+                cache_df["latitude"].to_numpy(), cache_df["longitude"].to_numpy(), resolution
+            )
+        if missing_resolutions:
+            self._write_cache(cache_df)
+
+        return cache_df.set_index(["latitude", "longitude"])
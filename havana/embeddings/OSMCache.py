@@ -0,0 +1,260 @@
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from shapely.geometry.base import BaseGeometry
+
+
+class OSMCache:
+    """
+    On-disk cache, as GeoParquet, of the OSM data of a state shared by the embedders: the state area and the
+    features loaded for an area and a tag set. The area is content-addressed by the state, its source and the
+    checksums of the source files. Features are content-addressed by the state, the area geometry, the tags and
+    the PBF file checksum (or the download source when there is no local PBF file). The joint of
+    regions and features is stored as a sparse region x feature matrix of the join positions, keyed by the state,
+    H3 resolution, tags, OSM data and the regions and features ids
+
+    Args:
+        state (str): State
+        metadata (dict): Metadata
+
+    Functions:
+        _file_checksum: Checksum of an input file
+        _area_key: Key of the state area of a source
+        _osm_data_key: Key of the OSM data the features are loaded from
+        _features_key: Key of the features of an area and a tag set
+        _joint_key: Key of the joint of regions and features
+        area: State area, loaded once per source and source files
+        features: Features of an area and a tag set, loaded once
+        joint: Joint of regions and features, joined once
+    """
+
+    def __init__(self, state: str, metadata: dict):
+        self.state = state
+        self.metadata = metadata
+        self.folder = self.metadata["intermediate"]["osm"].format(state=self.state)
+        self.pbf_file = self.metadata["raw"].get("osm_pbf")
+
+    def _file_checksum(self, path: str) -> str:
+        """
+        Checksum of an input file. It is saved with the file size and modification time, so the file is only
+        hashed again when it changes
+
+        Args:
+            path (str): Input file path
+
+        Returns:
+            str: sha256 of the file
+        """
+        stat = os.stat(path)
+        path_key = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+        checksum_path = os.path.join(self.folder, f"checksum_{path_key}.json")
+        if os.path.exists(checksum_path):
+            with open(checksum_path) as file:
+                checksum = json.load(file)
+            if checksum["size"] == stat.st_size and checksum["mtime"] == stat.st_mtime:
+                return checksum["sha256"]
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha256.update(block)
+        Path(self.folder).mkdir(parents=True, exist_ok=True)
+        with open(checksum_path, "w") as file:
+            json.dump({"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256.hexdigest()}, file)
+
+        return sha256.hexdigest()
+
+    def _area_key(self, source: str, source_files: list[str]) -> str:
+        """
+        Key of the state area of a source
+
+        Args:
+            source (str): Source of the state area
+            source_files (list[str]): Files the state area is read from, empty for geocoded areas
+
+        Returns:
+            str: sha256 of the state, source and source files
+        """
+        sha256 = hashlib.sha256()
+        sha256.update(f"{self.state}:{source}".encode())
+        for source_file in source_files:
+            sha256.update(self._file_checksum(source_file).encode())
+
+        return sha256.hexdigest()
+
+    def _osm_data_key(self, source: str) -> str:
+        """
+        Key of the OSM data the features are loaded from
+
+        Args:
+            source (str): Download source, used when there is no local PBF file
+
+        Returns:
+            str: Checksum of the local PBF file, or the download source
+        """
+        return self._file_checksum(self.pbf_file) if self.pbf_file else f"download:{source}"
+
+    def _features_key(self, area: gpd.GeoDataFrame | BaseGeometry, tags: dict, source: str) -> str:
+        """
+        Key of the features of an area and a tag set
+
+        Args:
+            area (gpd.GeoDataFrame | BaseGeometry): Area of the features
+            tags (dict): OSM tags of the features
+            source (str): Download source, used when there is no local PBF file
+
+        Returns:
+            str: sha256 of the state, area, tags and OSM data
+        """
+        sha256 = hashlib.sha256()
+        sha256.update(self.state.encode())
+        if isinstance(area, BaseGeometry):
+            sha256.update(area.wkb)
+        else:
+            for geometry_wkb in area.geometry.to_wkb():
+                sha256.update(geometry_wkb)
+        sha256.update(json.dumps(tags, sort_keys=True, default=str).encode())
+        sha256.update(self._osm_data_key(source).encode())
+
+        return sha256.hexdigest()
+
+    def _joint_key(
+        self, regions_gdf: gpd.GeoDataFrame, features_gdf: gpd.GeoDataFrame, resolution: int, tags: dict, source: str
+    ) -> str:
+        """
+        Key of the joint of regions and features
+
+        Args:
+            regions_gdf (gpd.GeoDataFrame): Regions
+            features_gdf (gpd.GeoDataFrame): Features
+            resolution (int): H3 resolution of the regions
+            tags (dict): OSM tags of the features
+            source (str): Download source of the features, used when there is no local PBF file
+
+        Returns:
+            str: sha256 of the state, resolution, tags, OSM data and regions and features ids
+        """
+        sha256 = hashlib.sha256()
+        sha256.update(f"{self.state}:{resolution}".encode())
+        sha256.update(json.dumps(tags, sort_keys=True, default=str).encode())
+        sha256.update(self._osm_data_key(source).encode())
+        sha256.update(pd.util.hash_pandas_object(regions_gdf.index.to_series(), index=False).to_numpy().tobytes())
+        sha256.update(pd.util.hash_pandas_object(features_gdf.index.to_series(), index=False).to_numpy().tobytes())
+
+        return sha256.hexdigest()
+
+    def area(self, load_area: Callable[[], gpd.GeoDataFrame], source: str, source_files: list[str]) -> gpd.GeoDataFrame:
+        """
+        State area, loaded once per source and source files, so edited source files are loaded again
+
+        Args:
+            load_area (Callable[[], gpd.GeoDataFrame]): Loads the state area on a cache miss
+            source (str): Source of the state area
+            source_files (list[str]): Files the state area is read from, empty for geocoded areas
+
+        Returns:
+            gpd.GeoDataFrame: State area
+        """
+        path = os.path.join(self.folder, f"area_{self._area_key(source, source_files)}.parquet")
+        if os.path.exists(path):
+            logging.info(f"OSM cache hit: {self.state} area")
+            return gpd.read_parquet(path)
+
+        logging.info(f"OSM cache miss: {self.state} area")
+        area_gdf = load_area()
+        Path(self.folder).mkdir(parents=True, exist_ok=True)
+        area_gdf.to_parquet(path)
+
+        return area_gdf
+
+    def features(
+        self,
+        area: gpd.GeoDataFrame | BaseGeometry,
+        tags: dict,
+        load_features: Callable[[], gpd.GeoDataFrame],
+        source: str,
+    ) -> gpd.GeoDataFrame:
+        """
+        Features of an area and a tag set, loaded once
+
+        Args:
+            area (gpd.GeoDataFrame | BaseGeometry): Area of the features
+            tags (dict): OSM tags of the features
+            load_features (Callable[[], gpd.GeoDataFrame]): Loads the features on a cache miss
+            source (str): Download source, used when there is no local PBF file
+
+        Returns:
+            gpd.GeoDataFrame: Features
+        """
+        path = os.path.join(self.folder, f"features_{self._features_key(area, tags, source)}.parquet")
+        if os.path.exists(path):
+            logging.info(f"OSM cache hit: {self.state} features")
+            return gpd.read_parquet(path)
+
+        logging.info(f"OSM cache miss: {self.state} features")
+        features_gdf = load_features()
+        Path(self.folder).mkdir(parents=True, exist_ok=True)
+        features_gdf.to_parquet(path)
+
+        return features_gdf
+
+    def joint(
+        self,
+        regions_gdf: gpd.GeoDataFrame,
+        features_gdf: gpd.GeoDataFrame,
+        resolution: int,
+        tags: dict,
+        join: Callable[[], gpd.GeoDataFrame],
+        source: str,
+    ) -> gpd.GeoDataFrame:
+        """
+        Joint of regions and features, joined once. It is stored as a sparse region x feature matrix whose entries
+        are the positions of the pairs in the joint, plus one, and rebuilt from its non-zero entries in the join
+        order, as the joint has no columns besides its index
+
+        Args:
+            regions_gdf (gpd.GeoDataFrame): Regions
+            features_gdf (gpd.GeoDataFrame): Features
+            resolution (int): H3 resolution of the regions
+            tags (dict): OSM tags of the features
+            join (Callable[[], gpd.GeoDataFrame]): Joins the regions and features on a cache miss
+            source (str): Download source of the features, used when there is no local PBF file
+
+        Returns:
+            gpd.GeoDataFrame: Joint, indexed by region and feature
+        """
+        region_ids = regions_gdf.index.to_numpy().astype(str)
+        feature_ids = features_gdf.index.to_numpy().astype(str)
+        path = os.path.join(
+            self.folder, f"joint_{self._joint_key(regions_gdf, features_gdf, resolution, tags, source)}.npz"
+        )
+        if os.path.exists(path):
+            logging.info(f"OSM cache hit: {self.state} joint, {resolution} resolution")
+            positions = sp.load_npz(path).tocoo()
+            order = np.argsort(positions.data)
+            index = pd.MultiIndex.from_arrays(
+                [region_ids[positions.row[order]], feature_ids[positions.col[order]]],
+                names=[regions_gdf.index.name, features_gdf.index.name],
+            )
+            return gpd.GeoDataFrame(index=index)
+
+        logging.info(f"OSM cache miss: {self.state} joint, {resolution} resolution")
+        joint_gdf = join()
+        rows = regions_gdf.index.get_indexer(joint_gdf.index.get_level_values(0))
+        columns = features_gdf.index.get_indexer(joint_gdf.index.get_level_values(1))
+        positions = sp.csr_matrix(
+            (np.arange(1, len(joint_gdf) + 1, dtype=np.int64), (rows, columns)),
+            shape=(len(region_ids), len(feature_ids)),
+        )
+        Path(self.folder).mkdir(parents=True, exist_ok=True)
+        sp.save_npz(path, positions)
+
+        return joint_gdf
@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import ClassVar
+
+import geopandas as gpd
+
+
+class StateNotFoundError(ValueError):
+    """
+    State not in the states boundaries shapefile
+
+    Args:
+        state (str): State
+        shapefile_path (str): States boundaries shapefile path
+    """
+
+    def __init__(self, state: str, shapefile_path: str):
+        super().__init__(f"State {state} not found in {shapefile_path}")
+
+
+class StatesBoundaries:
+    """
+    States boundaries from the local TIGER shapefiles. The shapefile is converted once to GeoParquet, rebuilt when
+    the shapefile is newer than it, and the states are kept in memory per process, so their spatial index is only
+    built once
+
+    Args:
+        metadata (dict): Metadata dictionary
+
+    Functions:
+        _read_shapefile: Read the states boundaries shapefile
+        checksum: Checksum of the states boundaries shapefile
+        states: States names and geometries
+        boundary: Boundary of a state
+    """
+
+    _states_cache: ClassVar[dict[str, gpd.GeoDataFrame]] = {}
+
+    def __init__(self, metadata: dict):
+        self.metadata = metadata
+        self.shapefile_path = self.metadata["raw"]["states_boundaries"]
+        self.path = self.metadata["intermediate"]["states_boundaries"]
+
+    def _read_shapefile(self) -> gpd.GeoDataFrame:
+        """
+        Read the states boundaries shapefile
+
+        Returns:
+            gpd.GeoDataFrame: States names and geometries, in EPSG:4326
+        """
+        return gpd.read_file(self.shapefile_path)[["NAME", "geometry"]].to_crs("EPSG:4326")
+
+    def checksum(self) -> str:
+        """
+        Checksum of the states boundaries shapefile geometries and names
+
+        Returns:
+            str: sha256 of the shapefile .shp and .dbf files
+        """
+        sha256 = hashlib.sha256()
+        for path in [self.shapefile_path, str(Path(self.shapefile_path).with_suffix(".dbf"))]:
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    sha256.update(block)
+
+        return sha256.hexdigest()
+
+    def states(self) -> gpd.GeoDataFrame:
+        """
+        States names and geometries, shared by every instance of the process with the same GeoParquet path
+
+        Returns:
+            gpd.GeoDataFrame: States names and geometries, in EPSG:4326
+        """
+        if self.path in self._states_cache:
+            return self._states_cache[self.path]
+
+        if os.path.exists(self.path) and os.path.getmtime(self.path) >= os.path.getmtime(self.shapefile_path):
+            states_gdf = gpd.read_parquet(self.path)
+        else:
+            states_gdf = self._read_shapefile()
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            states_gdf.to_parquet(self.path, index=False)
+            logging.info(f"States boundaries: {self.path}")
+        self._states_cache[self.path] = states_gdf
+
+        return states_gdf
+
+    def boundary(self, state: str) -> gpd.GeoDataFrame:
+        """
+        Boundary of a state, as the region GDF of a geocoded area
+
+        Args:
+            state (str): State
+
+        Returns:
+            gpd.GeoDataFrame: State boundary, indexed by region_id
+        """
+        states_gdf = self.states()
+        state_gdf = states_gdf[states_gdf["NAME"] == state]
+        if state_gdf.empty:
+            raise StateNotFoundError(state, self.shapefile_path)
+
+        return gpd.GeoDataFrame(
+            {"region_id": [state]}, geometry=[state_gdf.geometry.unary_union], crs=states_gdf.crs
+        ).set_index("region_id")
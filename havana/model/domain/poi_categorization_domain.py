@@ -1,31 +1,40 @@
 import json
 import logging
+import os
 
 import numpy as np
 import pandas as pd
 import sklearn.metrics as skm
-import spektral as sk
-import spektral.layers
 import tensorflow as tf
 from sklearn.model_selection import KFold
-from sklearn.preprocessing import MinMaxScaler
 from tensorflow.keras import utils as np_utils
 from tensorflow.keras.callbacks import EarlyStopping
 from tensorflow.keras.optimizers import Adam
 
 from havana.model.extractor.file_extractor import FileExtractor
+from havana.model.extractor.lazy_matrix_extractor import LazyMatrixFrame
+from havana.model.extractor.matrix_store_extractor import MatrixStoreExtractor
 from havana.model.loader.file_loader import FileLoader
 from havana.model.loader.poi_categorization_loader import PoiCategorizationLoader
 from havana.model.model.gnn_base_model_for_transfer_learning import GNNUS_BaseModel
 
 # from havana.model.model.pgcnn import GNNUS_BaseModel
-from havana.model.utils.nn_preprocessing import one_hot_decoding_predicted, split_graph, top_k_rows, top_k_rows_order
+from havana.model.utils.nn_preprocessing import (
+    gcn_filter_batch,
+    min_max_normalize_batch,
+    normalized_adjacency_batch,
+    one_hot_decoding_predicted,
+    split_graph,
+    top_k_rows,
+    top_k_rows_order,
+)
 
 
 class PoiCategorizationDomain:
     def __init__(self, dataset_name):
         self.file_loader = FileLoader()
         self.file_extractor = FileExtractor()
+        self.matrix_store_extractor = MatrixStoreExtractor()
         self.poi_categorization_loader = PoiCategorizationLoader()
         self.dataset_name = dataset_name
 
@@ -57,6 +66,112 @@ class PoiCategorizationDomain:
                 raise
             return adjacency_df, temporal_matrix_df
 
+    def read_matrix_lazy(
+        self,
+        adjacency_matrix_filename,
+        temporal_matrix_filename,
+        distance_matrix_filename=None,
+        duration_matrix_filename=None,
+    ):
+        """
+        Same as read_matrix, but the matrices are only parsed when the preprocessing reaches each user
+        """
+        adjacency_df = LazyMatrixFrame(adjacency_matrix_filename)
+        temporal_matrix_df = LazyMatrixFrame(temporal_matrix_filename)
+        if adjacency_df["user_id"].tolist() != temporal_matrix_df["user_id"].tolist():
+            logging.error("MATRIZES DIFERENTES")
+            raise
+        if distance_matrix_filename is not None and duration_matrix_filename is not None:
+            return (
+                adjacency_df,
+                temporal_matrix_df,
+                LazyMatrixFrame(distance_matrix_filename),
+                LazyMatrixFrame(duration_matrix_filename),
+            )
+        return adjacency_df, temporal_matrix_df
+
+    def read_matrix_store(
+        self,
+        matrix_store_folder,
+        adjacency_matrix_name,
+        temporal_matrix_name,
+        distance_matrix_name=None,
+        duration_matrix_name=None,
+    ):
+        """
+        Same as read_matrix for matrices written to a binary store, the users are in the same order
+        """
+        user_ids = self.matrix_store_extractor.read_user_ids(matrix_store_folder)
+        positions = self._shuffled_store_positions(user_ids)
+        category = self.matrix_store_extractor.read_matrices(matrix_store_folder, "category")
+
+        def read(name, with_visited_location_ids=False):
+            matrices = self.matrix_store_extractor.read_matrices(matrix_store_folder, name)
+            df = pd.DataFrame(
+                {
+                    "user_id": user_ids[positions],
+                    "matrices": pd.Series([matrices[i] for i in positions], dtype=object),
+                    "category": pd.Series([category[i] for i in positions], dtype=object),
+                }
+            )
+            if with_visited_location_ids:
+                visited_location_ids = self.matrix_store_extractor.read_matrices(
+                    matrix_store_folder, "visited_location_ids"
+                )
+                df["visited_location_ids"] = pd.Series([visited_location_ids[i] for i in positions], dtype=object)
+            return df
+
+        adjacency_df = read(adjacency_matrix_name, with_visited_location_ids=adjacency_matrix_name == "adjacency")
+        temporal_matrix_df = read(temporal_matrix_name)
+        if distance_matrix_name is not None and duration_matrix_name is not None:
+            return adjacency_df, temporal_matrix_df, read(distance_matrix_name), read(duration_matrix_name)
+        return adjacency_df, temporal_matrix_df
+
+    def read_user_embeddings_store(self, user_embeddings_folder):
+        """
+        Same as reading the user embeddings csv followed by drop_duplicates, for embeddings written to a binary
+        store. The embeddings are float32 views of a memory-mapped file, or, for a store of the users places,
+        the embeddings of their places regions
+        """
+        user_ids = self.matrix_store_extractor.read_user_ids(user_embeddings_folder)
+        positions = self._shuffled_store_positions(user_ids)
+        if os.path.exists(os.path.join(user_embeddings_folder, "regions.npy")):
+            regions = np.load(os.path.join(user_embeddings_folder, "regions.npy"), mmap_mode="r")
+            places_regions = pd.read_parquet(
+                os.path.join(user_embeddings_folder, "places.parquet"), columns=["region"]
+            )["region"].to_numpy()
+            places = self.matrix_store_extractor.read_matrices(user_embeddings_folder, "places")
+            embeddings = {i: regions[places_regions[places[i]]] for i in positions}
+        else:
+            embeddings = self.matrix_store_extractor.read_matrices(user_embeddings_folder, "embeddings")
+
+        return pd.DataFrame(
+            {
+                "user_id": user_ids[positions],
+                "embeddings": pd.Series([embeddings[i] for i in positions], dtype=object),
+            }
+        )
+
+    def _shuffled_store_positions(self, user_ids):
+        """
+        Positions of the users of a binary store after the same shuffle and deduplication as read_csv
+        followed by drop_duplicates
+        """
+        return (
+            pd.DataFrame({"user_id": user_ids})
+            .sample(frac=1, random_state=3)
+            .drop_duplicates(subset=["user_id"])
+            .index.to_numpy()
+        )
+
+    def _load_matrix(self, matrix):
+        """
+        Matrices read from csv are json strings, the ones read from a binary store are already arrays
+        """
+        if isinstance(matrix, str):
+            matrix = json.loads(matrix)
+        return np.array(matrix)
+
     def _poi_gnn_resize_adjacency_and_category_matrices(
         self, user_matrix, user_matrix_week, user_matrix_weekend, user_category, max_size_matrices, dataset_name
     ):
@@ -151,7 +266,6 @@ class PoiCategorizationDomain:
 
         location_time = location_time[idx]
         location_location = location_location[idx[:, None], idx].toarray()
-        location_location = sk.layers.GCNConv.preprocess(location_location)
 
         return location_time, location_location
 
@@ -217,22 +331,17 @@ class PoiCategorizationDomain:
 
             user_matrices = matrix_df[i]
             user_category = category_df[i]
-            user_matrices = json.loads(user_matrices)
-            user_matrices = np.array(user_matrices)
-            user_category = json.loads(user_category)
-            user_category = np.array(user_category)
+            user_matrices = self._load_matrix(user_matrices)
+            user_category = self._load_matrix(user_category)
             # week
             user_matrices_week = matrix_week_df[i]
-            user_matrices_week = json.loads(user_matrices_week)
-            user_matrices_week = np.array(user_matrices_week)
+            user_matrices_week = self._load_matrix(user_matrices_week)
             # weekend
             user_matrices_weekend = matrix_weekend_df[i]
-            user_matrices_weekend = json.loads(user_matrices_weekend)
-            user_matrices_weekend = np.array(user_matrices_weekend)
+            user_matrices_weekend = self._load_matrix(user_matrices_weekend)
             # user visited
             user_visited = visited_location_ids[i]
-            user_visited = json.loads(user_visited)
-            user_visited = np.array(user_visited)
+            user_visited = self._load_matrix(user_visited)
             size = user_matrices.shape[0]
 
             if size > maior:
@@ -252,41 +361,35 @@ class PoiCategorizationDomain:
 
             """feature"""
             user_temporal_matrices = temporal_df[i]
-            user_temporal_matrices = json.loads(user_temporal_matrices)
-            user_temporal_matrices = np.array(user_temporal_matrices)
+            user_temporal_matrices = self._load_matrix(user_temporal_matrices)
             # week
             user_temporal_matrices_week = temporal_week_df[i]
-            user_temporal_matrices_week = json.loads(user_temporal_matrices_week)
-            user_temporal_matrices_week = np.array(user_temporal_matrices_week)
+            user_temporal_matrices_week = self._load_matrix(user_temporal_matrices_week)
             # weekend
             user_temporal_matrices_weekend = temporal_weekend_df[i]
-            user_temporal_matrices_weekend = json.loads(user_temporal_matrices_weekend)
-            user_temporal_matrices_weekend = np.array(user_temporal_matrices_weekend)
+            user_temporal_matrices_weekend = self._load_matrix(user_temporal_matrices_weekend)
             """distance"""
             user_distance_matrix = distance_df[i]
-            user_distance_matrix = json.loads(user_distance_matrix)
-            user_distance_matrix = np.array(user_distance_matrix)
+            user_distance_matrix = self._load_matrix(user_distance_matrix)
             """duration"""
             user_duration_matrix = duration_df[i]
-            user_duration_matrix = json.loads(user_duration_matrix)
-            user_duration_matrix = np.array(user_duration_matrix)
+            user_duration_matrix = self._load_matrix(user_duration_matrix)
             """embeddings"""
             if not baseline:
                 user_embeddings_matrix = user_embeddings_df[i]
-                user_embeddings_matrix = json.loads(user_embeddings_matrix)
-                user_embeddings_matrix = np.array(user_embeddings_matrix)
+                user_embeddings_matrix = self._load_matrix(user_embeddings_matrix)
             for i in range(number_of_matrices):
                 idx = idxs[i]
-                matrices_list.append(sk.layers.ARMAConv.preprocess(user_matrices[i]))
-                matrices_week_list.append(sk.layers.ARMAConv.preprocess(user_matrices_week[i]))
-                matrices_weekend_list.append(sk.layers.ARMAConv.preprocess(user_matrices_weekend[i]))
+                matrices_list.append(user_matrices[i])
+                matrices_week_list.append(user_matrices_week[i])
+                matrices_weekend_list.append(user_matrices_weekend[i])
 
                 user_temporal_matrix = user_temporal_matrices[idx]
-                temporal_matrices_list.append(self._min_max_normalize(user_temporal_matrix))
+                temporal_matrices_list.append(user_temporal_matrix)
                 user_temporal_matrix_week = user_temporal_matrices_week[idx]
-                temporal_matrices_week_list.append(self._min_max_normalize(user_temporal_matrix_week))
+                temporal_matrices_week_list.append(user_temporal_matrix_week)
                 user_temporal_matrix_weekend = user_temporal_matrices_weekend[idx]
-                temporal_matrices_weekend_list.append(self._min_max_normalize(user_temporal_matrix_weekend))
+                temporal_matrices_weekend_list.append(user_temporal_matrix_weekend)
                 distance_matrices_list.append(user_distance_matrix[idx[:, None], idx])
                 duration_matrices_list.append(user_duration_matrix[idx[:, None], idx])
                 users_categories.append(user_category[i])
@@ -294,9 +397,7 @@ class PoiCategorizationDomain:
                 user_location_time, user_location_location = self._filter_pmi_matrix(
                     location_time_df, location_location_df, locationid_to_int, user_visited[idx]
                 )
-                user_location_time = self._min_max_normalize(user_location_time)
                 location_time_list.append(user_location_time)
-                user_location_location = spektral.layers.ARMAConv.preprocess(user_location_location)
                 location_location_list.append(user_location_location)
                 # embeddings
                 if not baseline:
@@ -309,22 +410,23 @@ class PoiCategorizationDomain:
         logging.info(f"Quantidade de usuários: {len(ids)}")
         logging.info(f"Quantidade de usuários removidos: {remove}")
         self.features_num_columns = temporal_matrices_list[-1].shape[1]
-        matrices_list = np.array(matrices_list)
-        location_time_list = np.array(location_time_list)
-        location_location_list = np.array(location_location_list)
-        temporal_matrices_list = np.array(temporal_matrices_list)
+        # the adjacency matrices are normalized at once, as ARMAConv.preprocess (and GCNConv.preprocess) would do
+        matrices_list = normalized_adjacency_batch(np.array(matrices_list))
+        location_time_list = min_max_normalize_batch(np.array(location_time_list))
+        location_location_list = normalized_adjacency_batch(gcn_filter_batch(np.array(location_location_list)))
+        temporal_matrices_list = min_max_normalize_batch(np.array(temporal_matrices_list))
         users_categories = np.array(users_categories)
 
         distance_matrices_list = np.array(distance_matrices_list)
         duration_matrices_list = np.array(duration_matrices_list)
 
         # week
-        matrices_week_list = np.array(matrices_week_list)
-        temporal_matrices_week_list = np.array(temporal_matrices_week_list)
+        matrices_week_list = normalized_adjacency_batch(np.array(matrices_week_list))
+        temporal_matrices_week_list = min_max_normalize_batch(np.array(temporal_matrices_week_list))
 
         # weekend
-        matrices_weekend_list = np.array(matrices_weekend_list)
-        temporal_matrices_weekend_list = np.array(temporal_matrices_weekend_list)
+        matrices_weekend_list = normalized_adjacency_batch(np.array(matrices_weekend_list))
+        temporal_matrices_weekend_list = min_max_normalize_batch(np.array(temporal_matrices_weekend_list))
         temporal_matrices_week_list = np.array(temporal_matrices_week_list)
 
         # embeddings
@@ -698,11 +800,3 @@ class PoiCategorizationDomain:
                 new_report[key] = report[key]
 
         return new_report
-
-    def _min_max_normalize(self, matrix):
-        matrix_1 = matrix.transpose()
-        scaler = MinMaxScaler()
-        scaler.fit(matrix_1)
-        matrix_1 = scaler.transform(matrix_1).transpose()
-
-        return matrix_1
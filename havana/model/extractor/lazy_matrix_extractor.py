@@ -0,0 +1,79 @@
+import csv
+import mmap
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class LazyMatrixColumn(Sequence):
+    """
+    Column of a LazyMatrixFrame, its values are only read when indexed
+    """
+
+    def __init__(self, frame, column):
+        self.frame = frame
+        self.column = column
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __getitem__(self, i):
+        return self.frame.field(i, self.column)
+
+    def tolist(self):
+        return self
+
+
+class LazyMatrixFrame:
+    """
+    Matrices csv file memory-mapped and indexed by row. A row is only parsed when one of its fields is read,
+    the users are shuffled and deduplicated as in FileExtractor.read_csv followed by drop_duplicates
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_end = self.mm.find(b"\n")
+        self.columns = next(csv.reader([self.mm[:header_end].decode().rstrip("\r")]))
+        starts = []
+        ends = []
+        user_ids = []
+        position = header_end + 1
+        while position < len(self.mm):
+            end = self.mm.find(b"\n", position)
+            if end == -1:
+                end = len(self.mm)
+            if end > position:
+                starts.append(position)
+                ends.append(end)
+                user_ids.append(int(self.mm[position : self.mm.find(b",", position)]))
+            position = end + 1
+
+        rows = (
+            pd.DataFrame({"user_id": user_ids})
+            .sample(frac=1, random_state=3)
+            .drop_duplicates(subset=["user_id"])
+            .index.to_numpy()
+        )
+        self.starts = np.array(starts, dtype=np.int64)[rows]
+        self.ends = np.array(ends, dtype=np.int64)[rows]
+        self.user_ids = np.array(user_ids, dtype=np.int64)[rows]
+        self.cached_row = None
+        self.cached_fields = None
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __getitem__(self, column):
+        if column == "user_id":
+            return pd.Series(self.user_ids, name="user_id")
+        return LazyMatrixColumn(self, column)
+
+    def field(self, i, column):
+        if self.cached_row != i:
+            line = self.mm[self.starts[i] : self.ends[i]].decode().rstrip("\r")
+            self.cached_fields = next(csv.reader([line]))
+            self.cached_row = i
+        return self.cached_fields[self.columns.index(column)]
@@ -0,0 +1,26 @@
+import json
+import os
+
+import numpy as np
+
+
+class MatrixStoreExtractor:
+    def __init__(self):
+        pass
+
+    def read_user_ids(self, folder):
+        return np.load(os.path.join(folder, "user_id.npy"))
+
+    def read_matrices(self, folder, name):
+        """
+        Read a matrix of every user from a store written by MatrixStoreLoader, as views of a memory-mapped file
+        """
+        with open(os.path.join(folder, "index.json")) as file:
+            dtype = json.load(file)["dtypes"][name]
+        offsets = np.load(os.path.join(folder, f"{name}_offsets.npy"))
+        shapes = np.load(os.path.join(folder, f"{name}_shapes.npy"))
+        if offsets[-1] == 0:
+            return [np.zeros(shape, dtype=dtype) for shape in shapes]
+
+        data = np.memmap(os.path.join(folder, f"{name}.bin"), dtype=dtype, mode="r")
+        return [data[offsets[i] : offsets[i + 1]].reshape(shapes[i]) for i in range(len(shapes))]
@@ -1,4 +1,5 @@
 import logging
+from functools import partial
 from pathlib import Path
 
 import pandas as pd
@@ -8,6 +9,17 @@ from havana.model.domain.poi_categorization_domain import PoiCategorizationDomai
 from havana.model.extractor.file_extractor import FileExtractor
 from havana.model.loader.poi_categorization_loader import PoiCategorizationLoader
 
+MATRICES_FILENAMES = {
+    "adjacency": "adjacency_matrix_not_directed_48_7_categories_US.csv",
+    "adjacency_weekday": "adjacency_matrix_weekday_not_directed_48_7_categories_US.csv",
+    "adjacency_weekend": "adjacency_matrix_weekend_not_directed_48_7_categories_US.csv",
+    "temporal": "features_matrix_not_directed_48_7_categories_US.csv",
+    "temporal_weekday": "features_matrix_weekday_not_directed_48_7_categories_US.csv",
+    "temporal_weekend": "features_matrix_weekend_not_directed_48_7_categories_US.csv",
+    "distance": "distance_matrix_not_directed_48_7_categories_US.csv",
+    "duration": "duration_matrix_not_directed_48_7_categories_US.csv",
+}
+
 
 class PoiCategorizationJob:
     def __init__(self):
@@ -16,16 +28,51 @@ class PoiCategorizationJob:
         self.poi_categorization_loader = PoiCategorizationLoader()
         self.poi_categorization_configuration = BasePoiCategorizationConfiguration()
 
-    def run(self, state, embedder, embeddings_dimension, h3_resolution, metadata):
+    def _matrix_reader(self, folder, matrices_format, lazy):
+        """
+        Reader of the users matrices and the names it reads each matrix by
+        :param folder: processed gowalla folder of the state
+        :param matrices_format: "csv" or "binary"
+        :param lazy: parse each user's csv matrices only when they are read
+        :return: read_matrix function and the csv filename or matrix store name of each matrix
+        """
+        if matrices_format == "binary":
+            matrix_store_folder = folder + "matrices_7_categories_US/"
+            matrices_names = {name: name for name in MATRICES_FILENAMES}
+            return partial(self.poi_categorization_domain.read_matrix_store, matrix_store_folder), matrices_names
+
+        matrices_names = {name: folder + filename for name, filename in MATRICES_FILENAMES.items()}
+        if lazy:
+            return self.poi_categorization_domain.read_matrix_lazy, matrices_names
+        return self.poi_categorization_domain.read_matrix, matrices_names
+
+    def _read_user_embeddings(self, metadata, state, embedder, embeddings_dimension, h3_resolution, embeddings_format):
+        """
+        Read the users region embeddings
+        :param embeddings_format: "csv" or "binary"
+        :return: users embeddings, one row per user
+        """
+        user_embeddings_filename = metadata["processed"]["user_embeddings"].format(embedder=embedder, state=state)
+        user_embeddings_filename = (
+            user_embeddings_filename + f"{embeddings_dimension}_dimension_{h3_resolution}_resolution"
+        )
+        if embeddings_format == "binary":
+            return self.poi_categorization_domain.read_user_embeddings_store(user_embeddings_filename + "/")
+        return self.file_extractor.read_csv(user_embeddings_filename + ".csv").drop_duplicates(subset=["user_id"])
+
+    def run(
+        self,
+        state,
+        embedder,
+        embeddings_dimension,
+        h3_resolution,
+        metadata,
+        matrices_format="csv",
+        lazy=False,
+        embeddings_format="csv",
+    ):
         folder = metadata["processed"]["gowalla"].format(state=state)
-        adjacency_matrix_filename = folder + "adjacency_matrix_not_directed_48_7_categories_US.csv"
-        adjacency_matrix_week_filename = folder + "adjacency_matrix_weekday_not_directed_48_7_categories_US.csv"
-        adjacency_matrix_weekend_filename = folder + "adjacency_matrix_weekend_not_directed_48_7_categories_US.csv"
-        temporal_matrix_filename = folder + "features_matrix_not_directed_48_7_categories_US.csv"
-        temporal_matrix_week_filename = folder + "features_matrix_weekday_not_directed_48_7_categories_US.csv"
-        temporal_matrix_weekend_filename = folder + "features_matrix_weekend_not_directed_48_7_categories_US.csv"
-        distance_matrix_filename = folder + "distance_matrix_not_directed_48_7_categories_US.csv"
-        duration_matrix_filename = folder + "duration_matrix_not_directed_48_7_categories_US.csv"
+        read_matrix, matrices_names = self._matrix_reader(folder, matrices_format, lazy)
         dataset_name = "gowalla"
         categories_type = "7_categories"
         location_location_filename = folder + "location_location_pmi_matrix_7_categories_US.npz"
@@ -46,28 +93,24 @@ class PoiCategorizationJob:
             temporal_df,
             distance_df,
             duration_df,
-        ) = self.poi_categorization_domain.read_matrix(
-            adjacency_matrix_filename,
-            temporal_matrix_filename,
-            distance_matrix_filename,
-            duration_matrix_filename,
+        ) = read_matrix(
+            matrices_names["adjacency"],
+            matrices_names["temporal"],
+            matrices_names["distance"],
+            matrices_names["duration"],
         )
         # region embeddings matrices
         if embedder != "baseline":
-            user_embeddings_filename = metadata["processed"]["user_embeddings"].format(embedder=embedder, state=state)
-            user_embeddings_filename = (
-                user_embeddings_filename + f"{embeddings_dimension}_dimension_{h3_resolution}_resolution.csv"
-            )
-            user_embeddings_df = self.file_extractor.read_csv(user_embeddings_filename).drop_duplicates(
-                subset=["user_id"]
+            user_embeddings_df = self._read_user_embeddings(
+                metadata, state, embedder, embeddings_dimension, h3_resolution, embeddings_format
             )
         # week matrices
-        adjacency_week_df, temporal_week_df = self.poi_categorization_domain.read_matrix(
-            adjacency_matrix_week_filename, temporal_matrix_week_filename
+        adjacency_week_df, temporal_week_df = read_matrix(
+            matrices_names["adjacency_weekday"], matrices_names["temporal_weekday"]
         )
         # weekend matrices
-        adjacency_weekend_df, temporal_weekend_df = self.poi_categorization_domain.read_matrix(
-            adjacency_matrix_weekend_filename, temporal_matrix_weekend_filename
+        adjacency_weekend_df, temporal_weekend_df = read_matrix(
+            matrices_names["adjacency_weekend"], matrices_names["temporal_weekend"]
         )
 
         matrices_to_verify = [
@@ -72,3 +72,42 @@ def top_k_rows_order(graph, k):
     new_graph = new_graph[:k]
 
     return np.array(new_graph)
+
+
+def normalized_adjacency_batch(adjacency):
+    """
+    Symmetric normalization D^-1/2 A D^-1/2 of a batch of adjacency matrices with shape (n_graphs, k, k),
+    equal to applying spektral's ARMAConv.preprocess to each matrix
+    """
+    adjacency = np.asarray(adjacency)
+    with np.errstate(divide="ignore"):
+        degrees = np.power(adjacency.sum(-1), -0.5)
+    degrees[np.isinf(degrees)] = 0.0
+
+    return degrees[:, :, None] * adjacency * degrees[:, None, :]
+
+
+def gcn_filter_batch(adjacency):
+    """
+    Adds self-loops and normalizes a batch of adjacency matrices with shape (n_graphs, k, k),
+    equal to applying spektral's GCNConv.preprocess to each matrix
+    """
+    adjacency = np.asarray(adjacency)
+
+    return normalized_adjacency_batch(adjacency + np.eye(adjacency.shape[-1]))
+
+
+def min_max_normalize_batch(matrices):
+    """
+    Min-max normalization of each row of a batch of matrices with shape (n_graphs, k, features), equal to
+    fitting and applying sklearn's MinMaxScaler to the transpose of each matrix. Rows with a range close to
+    zero are only shifted by their minimum, as in sklearn
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    data_min = np.nanmin(matrices, axis=-1, keepdims=True)
+    data_range = np.nanmax(matrices, axis=-1, keepdims=True) - data_min
+    data_range[data_range < 10 * np.finfo(data_range.dtype).eps] = 1.0
+    scale = 1.0 / data_range
+    shift = 0.0 - data_min * scale
+
+    return matrices * scale + shift
@@ -1,8 +1,9 @@
 import logging
 import math
+import multiprocessing
 import os
-import statistics as st
 import time
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
@@ -12,10 +13,32 @@ from havana.model_preprocess.configuration.base_poi_categorization_configuration
     BasePoiCategorizationConfiguration,
 )
 from havana.model_preprocess.configuration.weekday import Weekday
+from havana.model_preprocess.loader.buffered_csv_loader import BufferedCsvLoader
 from havana.model_preprocess.loader.matrix_generation_for_poi_categorization_loarder import (
     MatrixGenerationForPoiCategorizationLoader,
 )
-from havana.model_preprocess.util.geospatial_utils import points_distance
+from havana.model_preprocess.loader.matrix_store_loader import MatrixStoreLoader
+from havana.model_preprocess.util.geospatial_utils import points_distances
+
+_shared_count_usuarios = None
+
+
+def _init_shard_worker(count_usuarios):
+    global _shared_count_usuarios
+    _shared_count_usuarios = count_usuarios
+
+
+def _generate_shard_matrices(
+    dataset_name, users_checkin, files_names, matrix_store_folder, csv_buffer_size, *users_matrices_args
+):
+    domain = MatrixGenerationForPoiCategorizationDomain(dataset_name)
+    domain.shared_count_usuarios = _shared_count_usuarios
+    if matrix_store_folder is not None:
+        domain.matrix_store = MatrixStoreLoader(matrix_store_folder)
+    else:
+        domain.csv_loader = domain._open_csv_loader(files_names, csv_buffer_size)
+    domain._generate_users_matrices(users_checkin, files_names, *users_matrices_args)
+    domain._close_loaders()
 
 
 class MatrixGenerationForPoiCategorizationDomain:
@@ -28,6 +51,9 @@ class MatrixGenerationForPoiCategorizationDomain:
         self.max_events = 200
         self.count_usuarios = 0
         self.anterior = 0
+        self.shared_count_usuarios = None
+        self.matrix_store = None
+        self.csv_loader = None
         self.LL = np.array([])
         self.LT = np.array([])
 
@@ -55,93 +81,129 @@ class MatrixGenerationForPoiCategorizationDomain:
         """
 
         user_checkin = user_checkin.sort_values(by=[datetime_column])
-        latitude_list = user_checkin[latitude_column].tolist()
-        longitude_list = user_checkin[longitude_column].tolist()
-
-        user_checkin[category_column] = np.array(
+        latitudes = user_checkin[latitude_column].to_numpy(dtype=float)
+        longitudes = user_checkin[longitude_column].to_numpy(dtype=float)
+        categories = np.array(
             [
                 self.poi_categorization_configuration.GOWALLA_7_CATEGORIES_TO_INT[i]
                 for i in user_checkin["category"].tolist()
             ]
         )
 
-        # matrices initialization
-        visited_location_ids = user_checkin[locationid_column].tolist()
-        visited_location_ids_real = []
-        n_pois = len(user_checkin[locationid_column].unique().tolist())
-        adjacency_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
-        adjacency_weekday_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
-        adjacency_weekend_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
-        temporal_weekday_matrix = [[0 for i in range(24)] for j in range(n_pois)]
-        temporal_weekend_matrix = [[0 for i in range(24)] for j in range(n_pois)]
-        distance_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
-        duration_matrix = [[[] for i in range(n_pois)] for j in range(n_pois)]
-        temporal_matrix = [[0 for i in range(48)] for j in range(n_pois)]
-        categories_list = [-1 for i in range(n_pois)]
-        datetimes = user_checkin[datetime_column].tolist()
-        placeids = user_checkin[locationid_column].tolist()
-        placeids_unique = user_checkin[locationid_column].unique().tolist()
-        placeids_unique_to_int = {placeids_unique[i]: i for i in range(len(placeids_unique))}
-
         # converter os ids dos locais para inteiro
-        placeids_int = [placeids_unique_to_int[placeids[i]] for i in range(len(placeids))]
-        categories = user_checkin[category_column].tolist()
+        placeids_int, _ = pd.factorize(user_checkin[locationid_column])
+        datetimes = user_checkin[datetime_column]
+        weekdays = datetimes.dt.weekday.to_numpy()
+        hours = datetimes.dt.hour.to_numpy()
 
-        if datetimes[0].weekday() < 5:
-            hour = datetimes[0].hour
-            temporal_matrix[placeids_int[0]][hour] += 1
-            temporal_weekday_matrix[placeids_int[0]][hour] += 1
-        else:
-            hour = datetimes[0].hour + 24
-            temporal_matrix[placeids_int[0]][hour] += 1
-            temporal_weekend_matrix[placeids_int[0]][hour - 24] += 1
-        categories_list[0] = categories[0]
-
-        for j in range(1, len(datetimes)):
-            anterior = j - 1
-            atual = j
-            local_anterior = placeids_int[anterior]
-            local_atual = placeids_int[atual]
-            lat_before = latitude_list[anterior]
-            lng_before = longitude_list[anterior]
-            lat_current = latitude_list[atual]
-            lng_current = longitude_list[atual]
-            if distance_matrix[local_anterior][local_atual] == 0:
-                distance = int(points_distance([lat_before, lng_before], [lat_current, lng_current]) / 1000)
-                distance = self._distance_importance(distance)
-            else:
-                distance = distance_matrix[local_anterior][local_atual]
-
-            datetime_before = datetimes[anterior]
-            datetime_current = datetimes[atual]
-            duration = int((datetime_current - datetime_before).total_seconds() / 3600)
-            duration = self._duration_importance(duration)
-            distance_matrix[local_anterior][local_atual] = distance
-            distance_matrix[local_atual][local_anterior] = distance
-            duration_matrix[local_anterior][local_atual].append(duration)
-
-            adjacency_matrix[placeids_int[anterior]][placeids_int[atual]] += 1
-            adjacency_matrix[placeids_int[atual]][placeids_int[anterior]] += 1
-
-            if datetimes[atual].weekday() < 5:
-                adjacency_weekday_matrix[placeids_int[anterior]][placeids_int[atual]] += 1
-                adjacency_weekday_matrix[placeids_int[atual]][placeids_int[anterior]] += 1
-            else:
-                adjacency_weekend_matrix[placeids_int[anterior]][placeids_int[atual]] += 1
-                adjacency_weekend_matrix[placeids_int[atual]][placeids_int[anterior]] += 1
-
-            visited_location_ids_real.append(visited_location_ids[atual])
-
-            if datetimes[atual].weekday() < 5:
-                hour = datetimes[atual].hour
-                temporal_matrix[placeids_int[atual]][hour] += 1
-                temporal_weekday_matrix[placeids_int[atual]][hour] += 1
-            else:
-                hour = datetimes[atual].hour + 24
-                temporal_matrix[placeids_int[atual]][hour] += 1
-                temporal_weekend_matrix[placeids_int[atual]][hour - 24] += 1
-
-            categories_list[placeids_int[atual]] = categories[atual]
+        distances, durations = self._consecutive_importances(latitudes, longitudes, datetimes)
+
+        matrices = self._build_user_matrices(placeids_int, categories, weekdays, hours, distances, durations)
+        visited_location_ids_real = user_checkin[locationid_column].unique().tolist()
+        self._save_user_matrices(userid, matrices, visited_location_ids_real, files_names)
+
+        return pd.DataFrame(
+            {
+                "adjacency": ["vazio"],
+                "adjacency_weekday": ["vazio"],
+                "adjacency_weekend": ["vazio"],
+                "temporal": ["vazio"],
+                "distance": ["vazio"],
+                "duration": ["vazio"],
+                "temporal_weekday": ["vazio"],
+                "temporal_weekend": ["vazio"],
+                "visited_location_ids": ["vazio"],
+                "category": ["vazio"],
+            }
+        )
+
+    def generate_users_matrices_columnar(
+        self,
+        users_checkin,
+        userid_column,
+        datetime_column,
+        locationid_column,
+        latitude_column,
+        longitude_column,
+        files_names,
+    ):
+        """
+        Same matrices as generate_user_matrices for every user, computed from a single pass over the
+        check-ins sorted by user and datetime. Check-ins of a user at the same datetime keep their order
+        in users_checkin.
+        :param users_checkin:
+        :param userid_column:
+        :param datetime_column:
+        :param locationid_column:
+        :param latitude_column:
+        :param longitude_column:
+        :param files_names:
+        """
+        if len(users_checkin) == 0:
+            return
+
+        users_checkin = users_checkin.sort_values(by=[userid_column, datetime_column])
+        userids = users_checkin[userid_column].to_numpy()
+        placeids = users_checkin[locationid_column].to_numpy()
+        latitudes = users_checkin[latitude_column].to_numpy(dtype=float)
+        longitudes = users_checkin[longitude_column].to_numpy(dtype=float)
+        categories = np.array(
+            [
+                self.poi_categorization_configuration.GOWALLA_7_CATEGORIES_TO_INT[i]
+                for i in users_checkin["category"].tolist()
+            ]
+        )
+        datetimes = users_checkin[datetime_column]
+        weekdays = datetimes.dt.weekday.to_numpy()
+        hours = datetimes.dt.hour.to_numpy()
+
+        # pair i links check-in i to check-in i + 1, the pairs between two users are never read
+        distances, durations = self._consecutive_importances(latitudes, longitudes, datetimes)
+
+        starts = np.flatnonzero(np.r_[True, userids[1:] != userids[:-1]])
+        ends = np.r_[starts[1:], len(userids)]
+
+        # converter os ids dos locais para inteiro, por usuário e na ordem da primeira visita
+        placeids_codes, unique_placeids = pd.factorize(placeids)
+        users_index = np.repeat(np.arange(len(starts)), ends - starts)
+        users_placeids_int, _ = pd.factorize(users_index * len(unique_placeids) + placeids_codes)
+        offsets = np.r_[users_placeids_int[starts], users_placeids_int.max() + 1]
+        placeids_int = users_placeids_int - np.repeat(offsets[:-1], ends - starts)
+        visited_location_ids = placeids[np.unique(users_placeids_int, return_index=True)[1]]
+
+        for i in range(len(starts)):
+            start = starts[i]
+            end = ends[i]
+            matrices = self._build_user_matrices(
+                placeids_int[start:end],
+                categories[start:end],
+                weekdays[start:end],
+                hours[start:end],
+                distances[start : end - 1],
+                durations[start : end - 1],
+            )
+            visited_location_ids_real = visited_location_ids[offsets[i] : offsets[i + 1]].tolist()
+            self._save_user_matrices(userids[start], matrices, visited_location_ids_real, files_names)
+
+    def _save_user_matrices(self, userid, matrices, visited_location_ids_real, files_names):
+        """
+        Append a user's matrices to the matrices files
+        :param userid:
+        :param matrices: output of _build_user_matrices
+        :param visited_location_ids_real: location ids in the order of the matrices rows
+        :param files_names:
+        """
+        (
+            adjacency_matrix,
+            adjacency_weekday_matrix,
+            adjacency_weekend_matrix,
+            temporal_matrix,
+            temporal_weekday_matrix,
+            temporal_weekend_matrix,
+            distance_matrix,
+            duration_matrix,
+            categories_list,
+        ) = matrices
 
         adjacency_matrix, features_matrix, categories_list = self.remove_gps_pois_that_dont_have_categories(
             categories_list, adjacency_matrix, temporal_matrix
@@ -161,173 +223,233 @@ class MatrixGenerationForPoiCategorizationDomain:
             categories_list, adjacency_weekend_matrix, temporal_weekend_matrix
         )
 
-        duration_matrix = self._summarize_categories_distance_matrix(duration_matrix)
-
-        visited_location_ids_real = user_checkin[locationid_column].unique().tolist()
-
         if len(adjacency_matrix) < 2:
             logging.info("Usuário com poucas categorias diferentes visitadas")
-            return pd.DataFrame(
+            return
+
+        if self.matrix_store is not None:
+            self.matrix_store.append(
+                userid,
                 {
-                    "adjacency": ["vazio"],
-                    "adjacency_weekday": ["vazio"],
-                    "adjacency_weekend": ["vazio"],
-                    "temporal": ["vazio"],
-                    "distance": ["vazio"],
-                    "duration": ["vazio"],
-                    "temporal_weekday": ["vazio"],
-                    "temporal_weekend": ["vazio"],
-                    "visited_location_ids": ["vazio"],
-                    "category": ["vazio"],
-                }
+                    "adjacency": np.asarray(adjacency_matrix),
+                    "adjacency_weekday": np.asarray(adjacency_weekday_matrix),
+                    "adjacency_weekend": np.asarray(adjacency_weekend_matrix),
+                    "temporal": temporal_matrix,
+                    "temporal_weekday": temporal_weekday_matrix,
+                    "temporal_weekend": temporal_weekend_matrix,
+                    "distance": distance_matrix.astype(float),
+                    "duration": duration_matrix.astype(float),
+                    "visited_location_ids": np.asarray(visited_location_ids_real),
+                    "category": np.asarray(categories_list),
+                },
             )
+            self._report_progress()
+            return
 
-        columns = [
-            "userid",
-            "adjacency",
-            "adjacency_weekday",
-            "adjacency_weekend",
-            "temporal",
-            "distance",
-            "duration",
-            "temporal_weekday",
-            "temporal_weekend",
-            "visited_location_ids",
-            "category",
-        ]
-
-        user_checkin = pd.DataFrame(
-            {
-                "userid": [userid],
-                "adjacency": [adjacency_matrix],
-                "adjacency_weekday": [adjacency_weekday_matrix],
-                "adjacency_weekend": [adjacency_weekend_matrix],
-                "temporal": [temporal_matrix],
-                "distance": [distance_matrix],
-                "duration": [duration_matrix],
-                "temporal_weekday": [temporal_weekday_matrix],
-                "temporal_weekend": [temporal_weekend_matrix],
-                "visited_location_ids": [visited_location_ids_real],
-                "category": [categories_list],
-            }
-        )
+        temporal_matrix = temporal_matrix.tolist()
+        temporal_weekday_matrix = temporal_weekday_matrix.tolist()
+        temporal_weekend_matrix = temporal_weekend_matrix.tolist()
+        distance_matrix = distance_matrix.tolist()
+        duration_matrix = duration_matrix.tolist()
 
-        user_checkin = user_checkin[columns]
-        user_checkin.columns = np.array(
+        self.csv_loader.append(
             [
-                "userid",
-                "adjacency",
-                "adjacency_weekday",
-                "adjacency_weekend",
-                "temporal",
-                "distance",
-                "duration",
-                "temporal_weekday",
-                "temporal_weekend",
-                "visited_location_ids",
-                "category",
+                [userid, adjacency_matrix, categories_list, visited_location_ids_real],
+                [userid, adjacency_weekday_matrix, categories_list],
+                [userid, adjacency_weekend_matrix, categories_list],
+                [userid, temporal_matrix, categories_list],
+                [userid, temporal_weekday_matrix, categories_list],
+                [userid, temporal_weekend_matrix, categories_list],
+                [userid, distance_matrix, categories_list],
+                [userid, duration_matrix, categories_list],
             ]
         )
 
-        adjacency_matrix_df = user_checkin[["userid", "adjacency", "category", "visited_location_ids"]]
-        adjacency_weekday_matrix_df = user_checkin[["userid", "adjacency_weekday", "category"]]
-        adjacency_weekend_matrix_df = user_checkin[["userid", "adjacency_weekend", "category"]]
-        temporal_matrix_df = user_checkin[["userid", "temporal", "category"]]
-        temporal_weekday_matrix_df = user_checkin[["userid", "temporal_weekday", "category"]]
-        temporal_weekend_matrix_df = user_checkin[["userid", "temporal_weekend", "category"]]
-        distance_matrix_df = user_checkin[["userid", "distance", "category"]]
-        duration_matrix_df = user_checkin[["userid", "duration", "category"]]
-
-        adjacency_matrix_df.columns = ["user_id", "matrices", "category", "visited_location_ids"]
-        adjacency_weekend_matrix_df.columns = ["user_id", "matrices", "category"]
-        adjacency_weekday_matrix_df.columns = ["user_id", "matrices", "category"]
-        temporal_matrix_df.columns = ["user_id", "matrices", "category"]
-        temporal_weekday_matrix_df.columns = ["user_id", "matrices", "category"]
-        temporal_weekend_matrix_df.columns = ["user_id", "matrices", "category"]
-        distance_matrix_df.columns = ["user_id", "matrices", "category"]
-        duration_matrix_df.columns = ["user_id", "matrices", "category"]
-        files = [
-            adjacency_matrix_df,
-            adjacency_weekday_matrix_df,
-            adjacency_weekend_matrix_df,
-            temporal_matrix_df,
-            temporal_weekday_matrix_df,
-            temporal_weekend_matrix_df,
-            distance_matrix_df,
-            duration_matrix_df,
-        ]
-
-        self.matrix_generation_for_poi_categorization_loader.adjacency_features_matrices_to_csv(files, files_names)
+        self._report_progress()
 
-        self.count_usuarios += 1
-        if self.count_usuarios > self.anterior + 100:
-            self.anterior = self.count_usuarios
+    def _open_csv_loader(self, files_names, csv_buffer_size):
+        headers = [["user_id", "matrices", "category", "visited_location_ids"]] + [
+            ["user_id", "matrices", "category"] for _ in files_names[1:]
+        ]
+        return BufferedCsvLoader(files_names, headers, csv_buffer_size)
+
+    def _close_loaders(self):
+        if self.matrix_store is not None:
+            self.matrix_store.close()
+            self.matrix_store = None
+        if self.csv_loader is not None:
+            self.csv_loader.close()
+            self.csv_loader = None
+
+    def _report_progress(self):
+        if self.shared_count_usuarios is None:
+            self.count_usuarios += 1
+            if self.count_usuarios > self.anterior + 100:
+                self.anterior = self.count_usuarios
+                logging.info(f"Número de usuários: {self.count_usuarios}")
+            return
+
+        # count shared by the shard processes, each multiple of 100 is logged by a single process
+        with self.shared_count_usuarios.get_lock():
+            self.shared_count_usuarios.value += 1
+            self.count_usuarios = self.shared_count_usuarios.value
+        if self.count_usuarios % 100 == 0:
             logging.info(f"Número de usuários: {self.count_usuarios}")
-        return pd.DataFrame(
-            {
-                "adjacency": ["vazio"],
-                "adjacency_weekday": ["vazio"],
-                "adjacency_weekend": ["vazio"],
-                "temporal": ["vazio"],
-                "distance": ["vazio"],
-                "duration": ["vazio"],
-                "temporal_weekday": ["vazio"],
-                "temporal_weekend": ["vazio"],
-                "visited_location_ids": ["vazio"],
-                "category": ["vazio"],
-            }
+
+    def _build_user_matrices(self, placeids_int, categories, weekdays, hours, distances, durations):
+        """
+        Build a user's matrices from its check-ins sorted by datetime
+        :param placeids_int: place index of each check-in, in order of first visit
+        :param categories: category of each check-in
+        :param weekdays: weekday of each check-in
+        :param hours: hour of each check-in
+        :param distances: distance importance between each pair of consecutive check-ins
+        :param durations: duration importance between each pair of consecutive check-ins
+        :return: adjacency, temporal, distance and duration matrices and the categories list
+        """
+        n_pois = int(placeids_int.max()) + 1
+        anterior = placeids_int[:-1]
+        atual = placeids_int[1:]
+        weekend = weekdays >= Weekday.SATURDAY.value
+        weekend_atual = weekend[1:]
+
+        adjacency_matrix = np.zeros((n_pois, n_pois), dtype=np.int64)
+        np.add.at(adjacency_matrix, (anterior, atual), 1)
+        np.add.at(adjacency_matrix, (atual, anterior), 1)
+        adjacency_weekday_matrix = np.zeros((n_pois, n_pois), dtype=np.int64)
+        np.add.at(adjacency_weekday_matrix, (anterior[~weekend_atual], atual[~weekend_atual]), 1)
+        np.add.at(adjacency_weekday_matrix, (atual[~weekend_atual], anterior[~weekend_atual]), 1)
+        adjacency_weekend_matrix = np.zeros((n_pois, n_pois), dtype=np.int64)
+        np.add.at(adjacency_weekend_matrix, (anterior[weekend_atual], atual[weekend_atual]), 1)
+        np.add.at(adjacency_weekend_matrix, (atual[weekend_atual], anterior[weekend_atual]), 1)
+
+        temporal_matrix = np.zeros((n_pois, 48), dtype=np.int64)
+        np.add.at(temporal_matrix, (placeids_int, hours + 24 * weekend), 1)
+        temporal_weekday_matrix = np.zeros((n_pois, 24), dtype=np.int64)
+        np.add.at(temporal_weekday_matrix, (placeids_int[~weekend], hours[~weekend]), 1)
+        temporal_weekend_matrix = np.zeros((n_pois, 24), dtype=np.int64)
+        np.add.at(temporal_weekend_matrix, (placeids_int[weekend], hours[weekend]), 1)
+
+        # the category of a place is the one of its last check-in
+        last_checkins = len(placeids_int) - 1 - np.unique(placeids_int[::-1], return_index=True)[1]
+        categories_list = categories[last_checkins]
+
+        # object matrices keep int 0 for pairs never visited, as the original lists
+        distance_matrix = np.zeros((n_pois, n_pois), dtype=object)
+        if len(distances) > 0:
+            # a pair keeps the first non zero distance, it is only recomputed while it is zero
+            low = np.minimum(anterior, atual)
+            high = np.maximum(anterior, atual)
+            keys = low * n_pois + high
+            order = np.lexsort((np.arange(len(keys)), distances == 0, keys))
+            keys_sorted = keys[order]
+            first = order[np.r_[True, keys_sorted[1:] != keys_sorted[:-1]]]
+            values = distances[first].astype(object)
+            distance_matrix[low[first], high[first]] = values
+            distance_matrix[high[first], low[first]] = values
+
+        duration_matrix = np.zeros((n_pois, n_pois), dtype=object)
+        if len(durations) > 0:
+            # median of the durations of each directed pair
+            keys = anterior * n_pois + atual
+            order = np.lexsort((durations, keys))
+            keys_sorted = keys[order]
+            durations_sorted = durations[order]
+            starts = np.flatnonzero(np.r_[True, keys_sorted[1:] != keys_sorted[:-1]])
+            counts = np.diff(np.r_[starts, len(keys_sorted)])
+            middle = starts + counts // 2
+            medians = durations_sorted[middle]
+            even = counts % 2 == 0
+            medians[even] = (durations_sorted[middle[even] - 1] + durations_sorted[middle[even]]) / 2
+            keys_sorted = keys_sorted[starts]
+            duration_matrix[keys_sorted // n_pois, keys_sorted % n_pois] = medians.astype(object)
+
+        return (
+            adjacency_matrix,
+            adjacency_weekday_matrix,
+            adjacency_weekend_matrix,
+            temporal_matrix,
+            temporal_weekday_matrix,
+            temporal_weekend_matrix,
+            distance_matrix,
+            duration_matrix,
+            categories_list,
         )
 
+    def _consecutive_importances(self, latitudes, longitudes, datetimes):
+        """
+        Distance and duration importances between each check-in and the next one
+        :param latitudes:
+        :param longitudes:
+        :param datetimes: datetime Series
+        :return: distances and durations, one value per pair of consecutive check-ins
+        """
+        distances = points_distances(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
+        distances = (distances / 1000).astype(np.int64)
+        distances = self._importance(distances, self._distance_importance)
+        durations = (datetimes.diff().dt.total_seconds().to_numpy()[1:] / 3600).astype(np.int64)
+        durations = self._importance(durations, self._duration_importance)
+
+        return distances, durations
+
+    def _importance(self, values, importance_function):
+        """
+        Apply an importance function once per distinct value
+        :param values: integer array
+        :param importance_function: _distance_importance or _duration_importance
+        :return: float array
+        """
+        uniques, inverse = np.unique(values, return_inverse=True)
+        importances = np.array([importance_function(int(value)) for value in uniques], dtype=float)
+        return importances[inverse.reshape(-1)]
+
     def _create_location_coocurrency_matrix(
         self, users_checkins, userid_column, datetime_column, locationid_column, locationid_to_int
     ):
-        users_checkins["time"] = [d.time() for d in users_checkins[datetime_column]]
-        number_of_locations = len(users_checkins[locationid_column].unique())
-        self.LL = sparse.lil_matrix(
-            (number_of_locations, number_of_locations)
-        )  # location co occurency represents memory for save memory
-        cont = 0
+        """
+        Count, for each location, the locations visited up to 5 check-ins before and after it by the same user
+        """
         init = time.time()
-        for user_id in users_checkins[userid_column].unique():
-            if cont % 100 == 0:
-                end = time.time()
-                logging.info(f"usuário: {cont}")
-                logging.info(f"duração: {(end - init) / 60}")
-
-            cont += 1
-            users_checkins_sorted = users_checkins[users_checkins[userid_column] == user_id].sort_values(
-                by=[datetime_column]
-            )
-            locations = users_checkins_sorted[locationid_column].tolist()
-
-            for i in range(len(locations)):
-                current_location = locationid_to_int[locations[i]]
-                for j in range(1, 6):
-                    if (i - j) < 0:
-                        break
-                    self.LL[current_location, locationid_to_int[locations[i - j]]] += 1
-                for j in range(1, 6):
-                    if (i + j) > len(locations) - 1:
-                        break
-                    self.LL[current_location, locationid_to_int[locations[j + i]]] += 1
+        number_of_locations = len(locationid_to_int)
+        users_checkins = users_checkins.sort_values(by=[userid_column, datetime_column])
+        userids = users_checkins[userid_column].to_numpy()
+        locations = users_checkins[locationid_column].map(locationid_to_int).to_numpy()
+
+        rows = []
+        columns = []
+        for j in range(1, 6):
+            same_user = userids[:-j] == userids[j:]
+            before = locations[:-j][same_user]
+            after = locations[j:][same_user]
+            rows.extend([before, after])
+            columns.extend([after, before])
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+
+        # duplicated (row, column) pairs are summed when converting to csr
+        self.LL = sparse.coo_matrix(
+            (np.ones(len(rows)), (rows, columns)), shape=(number_of_locations, number_of_locations)
+        ).tocsr()
 
-        init = time.time()
         end = time.time()
         logging.info(f"calculou os totais {(end - init) / 60}")
 
-    def _create_LT_matrix(self, users_checinks, locationid_column, datetime_column, locationid_to_int):
-        locations = users_checinks[locationid_column].tolist()
-        datetimes = users_checinks[datetime_column].tolist()
-        unique_locationsids = users_checinks[locationid_column].unique().tolist()
-        total_locations = len(unique_locationsids)
+    def _create_LT_matrix(self, users_checinks, locationid_column, datetime_column, locationid_to_int, chunk_size=None):
+        """
+        Count the check-ins of each location per hour, weekend hours in the columns 24 to 47
+        :param chunk_size: check-ins processed at a time, all of them if None
+        """
+        total_locations = len(locationid_to_int)
         Dt = np.zeros((total_locations, 48))
+        if chunk_size is None:
+            chunk_size = max(len(users_checinks), 1)
 
-        for i in range(len(locations)):
-            current_location = locationid_to_int[locations[i]]
-            if datetimes[i].weekday() >= Weekday.SATURDAY.value:
-                Dt[current_location][datetimes[i].hour + 24] += 1
-            else:
-                Dt[current_location][datetimes[i].hour] += 1
+        for start in range(0, len(users_checinks), chunk_size):
+            chunk = users_checinks.iloc[start : start + chunk_size]
+            locations = chunk[locationid_column].map(locationid_to_int).to_numpy()
+            datetimes = chunk[datetime_column]
+            hours = datetimes.dt.hour.to_numpy() + 24 * (datetimes.dt.weekday.to_numpy() >= Weekday.SATURDAY.value)
+            Dt += np.bincount(locations * 48 + hours, minlength=total_locations * 48).reshape(total_locations, 48)
 
         self.LT = Dt
 
@@ -356,6 +478,11 @@ class MatrixGenerationForPoiCategorizationDomain:
         latitude_column,
         longitude_column,
         datetime_column,
+        columnar=False,
+        workers=1,
+        lt_chunk_size=None,
+        matrix_store_folder=None,
+        csv_buffer_size=100,
     ):
         # shuffle
         users_checkin = users_checkin.sample(frac=1, random_state=1).reset_index(drop=True)
@@ -391,7 +518,7 @@ class MatrixGenerationForPoiCategorizationDomain:
         locationid_to_int = {unique_locationsids[i]: i for i in range(len(unique_locationsids))}
         keys = list(locationid_to_int.keys())
         values = list(locationid_to_int.values())
-        self._create_LT_matrix(users_checkin, locationid_column, datetime_column, locationid_to_int)
+        self._create_LT_matrix(users_checkin, locationid_column, datetime_column, locationid_to_int, lt_chunk_size)
         logging.info("terminou LT")
         lt = pd.DataFrame(self.LT, columns=[str(i) for i in range(self.LT.shape[1])])
         self.matrix_generation_for_poi_categorization_loader.save_df_to_csv(
@@ -411,21 +538,125 @@ class MatrixGenerationForPoiCategorizationDomain:
         )
         self.LL = ""
 
-        users_checkin = users_checkin.groupby(userid_column).apply(
-            lambda e: self.generate_user_matrices(
-                e,
-                e[userid_column].iloc[0],
+        users_matrices_args = (
+            userid_column,
+            category_column,
+            locationid_column,
+            latitude_column,
+            longitude_column,
+            datetime_column,
+            columnar,
+        )
+        if matrix_store_folder is not None:
+            self.matrix_store = MatrixStoreLoader(matrix_store_folder)
+        if workers > 1:
+            self._generate_users_matrices_sharded(
+                users_checkin, files_names, *users_matrices_args, workers, csv_buffer_size
+            )
+        else:
+            if self.matrix_store is None:
+                self.csv_loader = self._open_csv_loader(files_names, csv_buffer_size)
+            self._generate_users_matrices(users_checkin, files_names, *users_matrices_args)
+        self._close_loaders()
+        logging.info("FIM")
+        end = time.time()
+        logging.info(f"Duração: {(end - start) / 60}")
+
+    def _generate_users_matrices(
+        self,
+        users_checkin,
+        files_names,
+        userid_column,
+        category_column,
+        locationid_column,
+        latitude_column,
+        longitude_column,
+        datetime_column,
+        columnar,
+    ):
+        if columnar:
+            self.generate_users_matrices_columnar(
+                users_checkin,
+                userid_column,
                 datetime_column,
                 locationid_column,
-                category_column,
                 latitude_column,
                 longitude_column,
                 files_names,
             )
-        )
-        logging.info("FIM")
-        end = time.time()
-        logging.info(f"Duração: {(end - start) / 60}")
+        else:
+            users_checkin = users_checkin.groupby(userid_column).apply(
+                lambda e: self.generate_user_matrices(
+                    e,
+                    e[userid_column].iloc[0],
+                    datetime_column,
+                    locationid_column,
+                    category_column,
+                    latitude_column,
+                    longitude_column,
+                    files_names,
+                )
+            )
+
+    def _generate_users_matrices_sharded(
+        self,
+        users_checkin,
+        files_names,
+        userid_column,
+        category_column,
+        locationid_column,
+        latitude_column,
+        longitude_column,
+        datetime_column,
+        columnar,
+        workers,
+        csv_buffer_size,
+    ):
+        """
+        Split the users in contiguous shards, in the same order groupby visits them, generate each shard's
+        matrices in its own process and concatenate the shards files in order, so the matrices files are
+        the same as the ones generated by a single process
+        """
+        userids = np.sort(users_checkin[userid_column].unique())
+        shards = [shard for shard in np.array_split(userids, workers) if len(shard) > 0]
+        shards_files_names = [[f"{file_name}.shard{i}" for file_name in files_names] for i in range(len(shards))]
+        self.delete_files([file_name for shard_files_names in shards_files_names for file_name in shard_files_names])
+
+        count_usuarios = multiprocessing.Value("i", 0)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_shard_worker, initargs=(count_usuarios,)
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _generate_shard_matrices,
+                    self.dataset_name,
+                    users_checkin[users_checkin[userid_column].isin(shards[i])],
+                    shards_files_names[i],
+                    None if self.matrix_store is None else f"{self.matrix_store.folder}shard{i}/",
+                    csv_buffer_size,
+                    userid_column,
+                    category_column,
+                    locationid_column,
+                    latitude_column,
+                    longitude_column,
+                    datetime_column,
+                    columnar,
+                )
+                for i in range(len(shards))
+            ]
+            for future in futures:
+                future.result()
+        self.count_usuarios = count_usuarios.value
+        logging.info(f"Número de usuários: {self.count_usuarios}")
+
+        if self.matrix_store is not None:
+            self.matrix_store.merge([f"{self.matrix_store.folder}shard{i}/" for i in range(len(shards))])
+            return
+
+        for i in range(len(files_names)):
+            self.matrix_generation_for_poi_categorization_loader.merge_csv_files(
+                [shard_files_names[i] for shard_files_names in shards_files_names], files_names[i]
+            )
 
     def remove_gps_pois_that_dont_have_categories(self, categories, adjacency_matrix, features_matrix):
         indexes_filtered_pois = []
@@ -450,21 +681,6 @@ class MatrixGenerationForPoiCategorizationDomain:
 
         return adjacency_matrix.tolist(), features_matrix.tolist(), categories.tolist()
 
-    def _summarize_categories_distance_matrix(self, categories_distances_matrix):
-        for row in range(len(categories_distances_matrix)):
-            category_distances_list = []
-            for column in range(len(categories_distances_matrix[row])):
-                values = categories_distances_matrix[row][column]
-
-                if len(values) == 0:
-                    categories_distances_matrix[row][column] = 0
-                    category_distances_list.append(0)
-                else:
-                    d_cc = st.median(values)
-                    categories_distances_matrix[row][column] = d_cc
-
-        return categories_distances_matrix
-
     def _duration_importance(self, duration):
         duration = duration * duration
         duration = -(duration / (self.duration_sigma * self.duration_sigma))
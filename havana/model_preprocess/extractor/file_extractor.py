@@ -2,10 +2,15 @@ import pandas as pd
 
 
 class FileExtractor:
-    def read_csv(self, filename, dtypes_columns=None):
+    def read_csv(self, filename, dtypes_columns=None, columns=None):
         if dtypes_columns is None:
-            df = pd.read_csv(filename)
+            df = pd.read_csv(filename, usecols=columns)
         else:
-            df = pd.read_csv(filename, dtype=dtypes_columns, encoding="utf-8")
+            df = pd.read_csv(filename, dtype=dtypes_columns, encoding="utf-8", usecols=columns)
+
+        return df.sample(frac=1, random_state=3)
+
+    def read_parquet(self, filename, columns=None):
+        df = pd.read_parquet(filename, columns=columns)
 
         return df.sample(frac=1, random_state=3)
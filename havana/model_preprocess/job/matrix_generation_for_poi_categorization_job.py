@@ -22,9 +22,19 @@ class MatrixGenerationForPoiCategorizationJob:
         self.matrix_generation_for_poi_categorization_domain = MatrixGenerationForPoiCategorizationDomain("gowalla")
         self.poi_categorization_configuration = BasePoiCategorizationConfiguration()
 
-    def run(self, state, metadata):
+    def run(
+        self,
+        state,
+        metadata,
+        columnar=False,
+        workers=1,
+        lt_chunk_size=None,
+        matrices_format="csv",
+        csv_buffer_size=100,
+        checkins_format="csv",
+    ):
         users_checkin_filename = metadata["intermediate"]["checkins"]
-        users_checkin_filename = users_checkin_filename + f"{state}.csv"
+        users_checkin_filename = users_checkin_filename + f"{state}.{checkins_format}"
         adjacency_matrix_base_filename = "adjacency_matrix"
         features_matrix_base_filename = "features_matrix"
         distance_matrix_base_filename = "distance_matrix"
@@ -73,9 +83,14 @@ class MatrixGenerationForPoiCategorizationJob:
             longitude_column: "float64",
         }
 
-        users_checkin = self.file_extractor.read_csv(users_checkin_filename, dtypes_columns).query(
-            country_column + " == '" + country + "'"
-        )
+        columns = [*dtypes_columns, country_column]
+        if checkins_format == "parquet":
+            users_checkin = self.file_extractor.read_parquet(users_checkin_filename, columns)
+            # same dtypes as the csv reader, which parses the categories as strings
+            users_checkin[locationid_column] = users_checkin[locationid_column].astype(str).astype("category")
+        else:
+            users_checkin = self.file_extractor.read_csv(users_checkin_filename, dtypes_columns, columns)
+        users_checkin = users_checkin.query(country_column + " == '" + country + "'")
         if category_column == category_name_column:
             categories = users_checkin[category_name_column].tolist()
             categories_int = []
@@ -184,6 +199,9 @@ class MatrixGenerationForPoiCategorizationJob:
             folder + "location_time_pmi_matrix_" + categories_type + "_" + country + ".csv"
         )
         int_to_locationid_filename = folder + "int_to_locationid_" + categories_type + "_" + country + ".csv"
+        matrix_store_folder = (
+            folder + "matrices_" + categories_type + "_" + country + "/" if matrices_format == "binary" else None
+        )
 
         self.matrix_generation_for_poi_categorization_domain.generate_pattern_matrices(
             users_checkin,
@@ -204,6 +222,11 @@ class MatrixGenerationForPoiCategorizationJob:
             latitude_column,
             longitude_column,
             datetime_column,
+            columnar,
+            workers,
+            lt_chunk_size,
+            matrix_store_folder,
+            csv_buffer_size,
         )
 
         logging.info(f"Matrices generated for {state} state")
@@ -0,0 +1,49 @@
+import csv
+import logging
+import os
+
+
+class BufferedCsvLoader:
+    """
+    Append rows to csv files kept open for the whole job, writing each file's rows in batches of buffer_size.
+    A file is only created when its first batch is written, with its header.
+    """
+
+    def __init__(self, files_names, headers, buffer_size=100):
+        self.files_names = files_names
+        self.headers = headers
+        self.buffer_size = buffer_size
+        self.files = [None for _ in files_names]
+        self.writers = [None for _ in files_names]
+        self.buffers = [[] for _ in files_names]
+        self.rows = [0 for _ in files_names]
+
+    def append(self, rows):
+        """
+        :param rows: one row for each file
+        """
+        for i in range(len(rows)):
+            self.buffers[i].append(rows[i])
+            self.rows[i] += 1
+            if len(self.buffers[i]) >= self.buffer_size:
+                self._flush(i)
+
+    def _flush(self, i):
+        if len(self.buffers[i]) == 0:
+            return
+
+        if self.files[i] is None:
+            self.files[i] = open(self.files_names[i], "w", newline="", encoding="utf-8")  # noqa: SIM115
+            self.writers[i] = csv.writer(self.files[i], lineterminator=os.linesep)
+            self.writers[i].writerow(self.headers[i])
+        self.writers[i].writerows(self.buffers[i])
+        self.buffers[i] = []
+
+    def close(self):
+        for i in range(len(self.files_names)):
+            self._flush(i)
+            if self.files[i] is None:
+                continue
+
+            self.files[i].close()
+            logging.info(f"{self.files_names[i]}: {self.rows[i]} linhas, {os.path.getsize(self.files_names[i])} bytes")
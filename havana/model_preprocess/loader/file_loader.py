@@ -1,4 +1,5 @@
 import os
+import shutil
 import time
 
 from scipy import sparse
@@ -20,3 +21,20 @@ class FileLoader:
         except (OSError, ValueError):
             time.sleep(8)
             sparse.save_npz(filename, matrix)
+
+    def merge_csv_files(self, filenames, filename):
+        """
+        Concatenate csv files written with the same header into filename, removing them
+        """
+        filenames = [part_filename for part_filename in filenames if os.path.exists(part_filename)]
+        if len(filenames) == 0:
+            return
+
+        with open(filename, "wb") as merged_file:
+            for i in range(len(filenames)):
+                with open(filenames[i], "rb") as part_file:
+                    header = part_file.readline()
+                    if i == 0:
+                        merged_file.write(header)
+                    shutil.copyfileobj(part_file, merged_file)
+                os.remove(filenames[i])
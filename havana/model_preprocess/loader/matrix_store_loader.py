@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+
+class MatrixStoreLoader:
+    """
+    Binary store of ragged per-user matrices. For each matrix name the folder has a flat data file
+    ({name}.bin), the users' offsets in it ({name}_offsets.npy) and the users' shapes ({name}_shapes.npy).
+    The users' ids are in user_id.npy and the data types in index.json.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        shutil.rmtree(folder, ignore_errors=True)
+        Path(folder).mkdir(parents=True, exist_ok=True)
+        self.user_ids = []
+        self.files = {}
+        self.offsets = {}
+        self.shapes = {}
+        self.dtypes = {}
+
+    def append(self, user_id, matrices):
+        """
+        :param user_id:
+        :param matrices: dict of matrix name to numpy array
+        """
+        self.user_ids.append(user_id)
+        for name, matrix in matrices.items():
+            if name not in self.files:
+                self.files[name] = open(os.path.join(self.folder, f"{name}.bin"), "wb")  # noqa: SIM115
+                self.offsets[name] = [0]
+                self.shapes[name] = []
+                self.dtypes[name] = np.asarray(matrix).dtype.str
+            matrix = np.ascontiguousarray(matrix, dtype=self.dtypes[name])
+            self.files[name].write(matrix.tobytes())
+            self.offsets[name].append(self.offsets[name][-1] + matrix.size)
+            self.shapes[name].append(matrix.shape)
+
+    def merge(self, folders):
+        """
+        Append the stores in folders, in order, and remove them
+        """
+        for folder in folders:
+            if not os.path.exists(os.path.join(folder, "index.json")):
+                shutil.rmtree(folder, ignore_errors=True)
+                continue
+
+            with open(os.path.join(folder, "index.json")) as file:
+                dtypes = json.load(file)["dtypes"]
+            self.user_ids.extend(np.load(os.path.join(folder, "user_id.npy")).tolist())
+            for name, dtype in dtypes.items():
+                if name not in self.files:
+                    self.files[name] = open(os.path.join(self.folder, f"{name}.bin"), "wb")  # noqa: SIM115
+                    self.offsets[name] = [0]
+                    self.shapes[name] = []
+                    self.dtypes[name] = dtype
+                with open(os.path.join(folder, f"{name}.bin"), "rb") as file:
+                    shutil.copyfileobj(file, self.files[name])
+                offsets = np.load(os.path.join(folder, f"{name}_offsets.npy"))
+                self.offsets[name].extend((offsets[1:] + self.offsets[name][-1]).tolist())
+                self.shapes[name].extend(map(tuple, np.load(os.path.join(folder, f"{name}_shapes.npy")).tolist()))
+            shutil.rmtree(folder)
+
+    def close(self):
+        for name, file in self.files.items():
+            file.close()
+            np.save(os.path.join(self.folder, f"{name}_offsets.npy"), np.array(self.offsets[name], dtype=np.int64))
+            np.save(os.path.join(self.folder, f"{name}_shapes.npy"), np.array(self.shapes[name], dtype=np.int64))
+        np.save(os.path.join(self.folder, "user_id.npy"), np.array(self.user_ids, dtype=np.int64))
+        with open(os.path.join(self.folder, "index.json"), "w") as file:
+            json.dump({"dtypes": self.dtypes}, file)
@@ -15,3 +15,24 @@ def points_distance(point_0, point_1):
     result = result * 6371000
     distance = result[0][1]
     return distance
+
+
+def points_distances(latitudes_0, longitudes_0, latitudes_1, longitudes_1):
+    """
+    Element-wise haversine distance, same formula as ``haversine_distances``
+    :param latitudes_0: array of lat
+    :param longitudes_0: array of lng
+    :param latitudes_1: array of lat
+    :param longitudes_1: array of lng
+    :return: distances
+    """
+    latitudes_0 = np.radians(latitudes_0)
+    longitudes_0 = np.radians(longitudes_0)
+    latitudes_1 = np.radians(latitudes_1)
+    longitudes_1 = np.radians(longitudes_1)
+    sin_latitude = np.sin(0.5 * (latitudes_0 - latitudes_1))
+    sin_longitude = np.sin(0.5 * (longitudes_0 - longitudes_1))
+    result = sin_latitude * sin_latitude + np.cos(latitudes_0) * np.cos(latitudes_1) * sin_longitude * sin_longitude
+    result = 2 * np.arcsin(np.sqrt(result))
+    # metros
+    return result * 6371000
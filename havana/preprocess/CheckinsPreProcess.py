@@ -1,7 +1,11 @@
 import logging
+from collections.abc import Iterator
 from pathlib import Path
 
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 
 class CheckinsPreProcess:
@@ -11,30 +15,57 @@ class CheckinsPreProcess:
     Args:
         state (str): State to execute the pipeline
         metadata (dict): Metadata dictionary
+        chunk_size (int): Checkins per chunk to stream the raw data, None to read it at once
+        checkins_format (str): Format of the intermediate checkins, "csv" or "parquet" (typed columns)
+        engine (str): Dataframe engine, "pandas" or "polars" (lazy frames, same output)
 
     Functions:
         _read_checkins: Read checkins data from raw data
         _format_checkins: Format checkins data
         _filter_checkins: Filter checkins data, removing users with less than 2 locals visited
+        _valid_users: Users with at least 2 locals visited, counted over the raw data chunks
+        _typed_checkins: Convert checkins data to the intermediate parquet types
         _write_checkins: Write checkins data to intermediate data
+        _close_checkins_writer: Close the parquet writer left open by chunked writes
+        _run_chunked: Run checkins preprocessing streaming the raw data in chunks
+        _run_polars: Run checkins preprocessing with Polars lazy frames
+        process: Format, filter and write the raw checkins data of the state
         run: Run checkins preprocessing
     """
 
-    def __init__(self, state: str, metadata: dict):
+    def __init__(
+        self,
+        state: str,
+        metadata: dict,
+        chunk_size: int | None = None,
+        checkins_format: str = "csv",
+        engine: str = "pandas",
+    ):
         self.state = state
         self.metadata = metadata
+        self.chunk_size = chunk_size
+        self.checkins_format = checkins_format
+        self.engine = engine
+        self.parquet_writer = None
 
-    def _read_checkins(self) -> pd.DataFrame:
+    def _read_checkins(
+        self, usecols: list[str] | None = None, chunk_size: int | None = None
+    ) -> pd.DataFrame | Iterator[pd.DataFrame]:
         """
         Read checkins data from raw data
 
+        Args:
+            usecols (list[str] | None): Columns to read, all the checkins columns if None
+            chunk_size (int | None): Checkins per chunk, None to read them at once
+
         Returns:
-            pd.DataFrame: Checkins data
+            pd.DataFrame | Iterator[pd.DataFrame]: Checkins data, or its chunks
         """
         checkins_df = pd.read_csv(
             self.metadata["raw"]["checkins"].format(state=self.state),
             index_col=False,
-            usecols=["userid", "datetime", "lat", "lng", "placeid", "categoryid"],
+            usecols=usecols or ["userid", "datetime", "lat", "lng", "placeid", "categoryid"],
+            chunksize=chunk_size,
         )
 
         return checkins_df
@@ -103,25 +134,157 @@ class CheckinsPreProcess:
 
         return checkins_df
 
-    def _write_checkins(self, checkins_df: pd.DataFrame) -> None:
+    def _valid_users(self) -> pd.Index:
+        """
+        Users with at least 2 locals visited, counted over the raw data chunks. A user visited 2 or more locals
+        when its smallest and largest placeid differ, so only these two values are kept per user
+
+        Returns:
+            pd.Index: Valid users
+        """
+        categoryids = pd.read_csv(self.metadata["raw"]["from_to_category_names"])["categoryid"]
+        places_range_per_user = None
+        for chunk_df in self._read_checkins(["userid", "placeid", "categoryid"], self.chunk_size):
+            # checkins without a known category are dropped by the merge in _format_checkins
+            chunk_df = chunk_df[chunk_df["categoryid"].isin(categoryids)]
+            # as nunique, null placeids are not locals
+            chunk_df = chunk_df[chunk_df["placeid"].notna()]
+            chunk_range = chunk_df.groupby("userid")["placeid"].agg(["min", "max"])
+            if places_range_per_user is None:
+                places_range_per_user = chunk_range
+            else:
+                places_range_per_user = (
+                    pd.concat([places_range_per_user, chunk_range]).groupby(level=0).agg({"min": "min", "max": "max"})
+                )
+
+        if places_range_per_user is None:
+            return pd.Index([])
+        return places_range_per_user.index[places_range_per_user["min"] != places_range_per_user["max"]]
+
+    def _typed_checkins(self, checkins_df: pd.DataFrame) -> pa.Table:
+        """
+        Convert checkins data to the intermediate parquet types: int64 ids, categorical names, timestamp datetime
+        and float64 coordinates, as read from the csv, so both formats give the same distances and H3 cells
+
+        Args:
+            checkins_df (pd.DataFrame): Checkins data
+
+        Returns:
+            pa.Table: Typed checkins data
+        """
+        checkins_df = checkins_df.astype({"latitude": "float64", "longitude": "float64"})
+        schema = pa.Schema.from_pandas(checkins_df, preserve_index=False)
+        names = pa.dictionary(pa.int32(), pa.string())
+        types = {
+            "userid": pa.int64(),
+            "placeid": pa.int64(),
+            "category": names,
+            "country_name": names,
+            "state_name": names,
+        }
+        schema = pa.schema([field.with_type(types.get(field.name, field.type)) for field in schema])
+
+        return pa.Table.from_pandas(checkins_df, schema=schema, preserve_index=False)
+
+    def _write_checkins(self, checkins_df: pd.DataFrame, append: bool = False) -> None:
         """
         Write checkins data to intermediate data
 
         Args:
             checkins_df (pd.DataFrame): Checkins data
+            append (bool): Append to the checkins already written, without header
         """
         path = self.metadata["intermediate"]["checkins"]
         Path(path).mkdir(parents=True, exist_ok=True)
-        path = path + f"{self.state}.csv"
-        logging.info("Writing checkins to intermediate data")
-        checkins_df.to_csv(path, index=False)
-        logging.info(f"Path: {path}")
+        path = path + f"{self.state}.{self.checkins_format}"
+        if not append:
+            logging.info("Writing checkins to intermediate data")
+        if self.checkins_format == "parquet":
+            checkins_table = self._typed_checkins(checkins_df)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(path, checkins_table.schema)
+            self.parquet_writer.write_table(checkins_table)
+            if self.chunk_size is None:
+                self.parquet_writer.close()
+                self.parquet_writer = None
+        else:
+            checkins_df.to_csv(path, index=False, mode="a" if append else "w", header=not append)
+        if not append:
+            logging.info(f"Path: {path}")
 
-    def run(self) -> None:
+    def _close_checkins_writer(self) -> None:
         """
-        Run checkins preprocessing
+        Close the parquet writer left open by chunked writes, writing the file footer
+        """
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+    def _run_chunked(self) -> None:
+        """
+        Run checkins preprocessing streaming the raw data in chunks: a first pass finds the users with at least
+        2 locals visited and a second one formats, filters and writes each chunk
+        """
+        valid_users = self._valid_users()
+        append = False
+        for chunk_df in self._read_checkins(chunk_size=self.chunk_size):
+            checkins_df = self._format_checkins(chunk_df)
+            checkins_df = checkins_df[checkins_df["userid"].isin(valid_users)]
+            self._write_checkins(checkins_df, append)
+            append = True
+        self._close_checkins_writer()
+
+    def _run_polars(self) -> None:
+        """
+        Run checkins preprocessing with Polars lazy frames: the raw data is scanned, joined with the category names
+        and filtered by the places quantity per user in a multithreaded query, and written as the pandas engine does
+        """
+        categories_from_to_lf = pl.scan_csv(self.metadata["raw"]["from_to_category_names"])
+
+        checkins_lf = (
+            pl.scan_csv(self.metadata["raw"]["checkins"].format(state=self.state))
+            .select(["userid", "categoryid", "placeid", "datetime", "lat", "lng"])
+            .with_row_index("row")
+            .join(categories_from_to_lf, on="categoryid", how="inner")
+            # same checkins order as the pandas merge
+            .sort("row", maintain_order=True)
+            .filter(pl.col("placeid").drop_nulls().n_unique().over("userid") >= 2)
+            .select(
+                pl.col("userid"),
+                pl.col("name").alias("category"),
+                pl.col("placeid"),
+                pl.col("datetime").str.to_datetime(time_unit="ns").alias("local_datetime"),
+                pl.col("lat").alias("latitude"),
+                pl.col("lng").alias("longitude"),
+                pl.lit("United States").alias("country_name"),
+                pl.lit(self.state).alias("state_name"),
+            )
+        )
+
+        self._write_checkins(checkins_lf.collect().to_pandas())
+        self._close_checkins_writer()
+
+    def process(self, checkins_df: pd.DataFrame) -> None:
+        """
+        Format, filter and write the raw checkins data of the state
+
+        Args:
+            checkins_df (pd.DataFrame): Raw checkins data
         """
-        checkins_df = self._read_checkins()
         checkins_df = self._format_checkins(checkins_df)
         checkins_df = self._filter_checkins(checkins_df)
         self._write_checkins(checkins_df)
+
+    def run(self) -> None:
+        """
+        Run checkins preprocessing
+        """
+        if self.engine == "polars":
+            self._run_polars()
+            return
+
+        if self.chunk_size is not None:
+            self._run_chunked()
+            return
+
+        self.process(self._read_checkins())
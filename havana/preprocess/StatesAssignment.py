@@ -0,0 +1,147 @@
+import logging
+import os
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from havana.embeddings.StatesBoundaries import StatesBoundaries
+
+
+class StatesAssignment:
+    """
+    Assign the state of the Gowalla checkins from the TIGER states boundaries. Each place is joined with the states
+    once: the placeid -> state lookup is cached with the boundaries checksum and later runs only join the places
+    that are not in it, rebuilding the whole lookup when the boundaries change
+
+    Args:
+        metadata (dict): Metadata dictionary
+
+    Functions:
+        _read_checkins: Read the checkins with category from raw data
+        _read_states: Read the states boundaries
+        _read_places_states: Read the cached placeid -> state lookup
+        _join_places_states: Join places with the states boundaries through their spatial index
+        _write_places_states: Write the placeid -> state lookup
+        _write_checkins: Write the geo-joined checkins
+        run: Run states assignment
+    """
+
+    def __init__(self, metadata: dict):
+        self.metadata = metadata
+        self.states_boundaries = StatesBoundaries(self.metadata)
+
+    def _read_checkins(self) -> pd.DataFrame:
+        """
+        Read the checkins with category from raw data
+
+        Returns:
+            pd.DataFrame: Checkins data
+        """
+        return pd.read_csv(self.metadata["raw"]["checkins_with_category"], index_col=False)
+
+    def _read_states(self) -> gpd.GeoDataFrame:
+        """
+        Read the states boundaries
+
+        Returns:
+            gpd.GeoDataFrame: States names and geometries, in EPSG:4326
+        """
+        return self.states_boundaries.states()
+
+    def _read_places_states(self, boundaries_checksum: str) -> pd.DataFrame:
+        """
+        Read the cached placeid -> state lookup
+
+        Args:
+            boundaries_checksum (str): Checksum of the current states boundaries
+
+        Returns:
+            pd.DataFrame: Places states, empty if there is no cache or it was joined with other boundaries
+        """
+        path = self.metadata["raw"]["places_states"]
+        if os.path.exists(path):
+            schema_metadata = pq.read_schema(path).metadata or {}
+            if schema_metadata.get(b"boundaries_checksum") == boundaries_checksum.encode():
+                return pd.read_parquet(path)
+            logging.info("States boundaries changed, rebuilding the places states")
+
+        return pd.DataFrame({"placeid": pd.Series(dtype="int64"), "NAME": pd.Series(dtype=object)})
+
+    def _join_places_states(self, places_df: pd.DataFrame, states_gdf: gpd.GeoDataFrame) -> pd.DataFrame:
+        """
+        Join places with the states boundaries through their spatial index. As in a left sjoin with the
+        intersects predicate, a place on a border gets every state it touches and a place outside all of them
+        gets no state
+
+        Args:
+            places_df (pd.DataFrame): Places data, with their coordinates
+            states_gdf (gpd.GeoDataFrame): States boundaries
+
+        Returns:
+            pd.DataFrame: Places states
+        """
+        points = gpd.points_from_xy(places_df["lng"], places_df["lat"], crs="EPSG:4326")
+        places_index, states_index = states_gdf.sindex.query(points, predicate="intersects")
+        order = np.lexsort((states_index, places_index))
+        places_index = places_index[order]
+        states_index = states_index[order]
+
+        placeids = places_df["placeid"].to_numpy()
+        matched_df = pd.DataFrame(
+            {"placeid": placeids[places_index], "NAME": states_gdf["NAME"].to_numpy()[states_index]}
+        )
+        unmatched_df = pd.DataFrame({"placeid": np.delete(placeids, places_index), "NAME": None})
+
+        return pd.concat([matched_df, unmatched_df], ignore_index=True)
+
+    def _write_places_states(self, places_states_df: pd.DataFrame, boundaries_checksum: str) -> None:
+        """
+        Write the placeid -> state lookup, with the checksum of the boundaries it was joined with
+
+        Args:
+            places_states_df (pd.DataFrame): Places states
+            boundaries_checksum (str): Checksum of the states boundaries
+        """
+        path = self.metadata["raw"]["places_states"]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        places_states_table = pa.Table.from_pandas(places_states_df, preserve_index=False)
+        places_states_table = places_states_table.replace_schema_metadata(
+            {**places_states_table.schema.metadata, b"boundaries_checksum": boundaries_checksum.encode()}
+        )
+        pq.write_table(places_states_table, path)
+        logging.info(f"Places states: {path}")
+
+    def _write_checkins(self, checkins_df: pd.DataFrame) -> None:
+        """
+        Write the geo-joined checkins
+
+        Args:
+            checkins_df (pd.DataFrame): Checkins data, with the state in the NAME column
+        """
+        path = self.metadata["raw"]["geo_checkins"]
+        logging.info("Writing geo-joined checkins")
+        checkins_df.to_csv(path, index=False)
+        logging.info(f"Path: {path}")
+
+    def run(self) -> None:
+        """
+        Run states assignment
+        """
+        checkins_df = self._read_checkins()
+        boundaries_checksum = self.states_boundaries.checksum()
+        places_states_df = self._read_places_states(boundaries_checksum)
+
+        places_df = checkins_df.drop_duplicates(subset=["placeid"])[["placeid", "lat", "lng"]]
+        new_places_df = places_df[~places_df["placeid"].isin(places_states_df["placeid"])]
+        logging.info(f"Places: {len(places_df)}, cached: {len(places_df) - len(new_places_df)}")
+        if len(new_places_df) > 0:
+            new_places_states_df = self._join_places_states(new_places_df, self._read_states())
+            places_states_df = pd.concat([places_states_df, new_places_states_df], ignore_index=True)
+            self._write_places_states(places_states_df, boundaries_checksum)
+
+        checkins_df = checkins_df.merge(places_states_df, on="placeid", how="left")
+        self._write_checkins(checkins_df)
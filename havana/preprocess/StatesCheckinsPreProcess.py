@@ -0,0 +1,88 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from havana.preprocess.CheckinsPreProcess import CheckinsPreProcess
+
+
+def _preprocess_state(state: str, checkins_df: pd.DataFrame, metadata: dict, checkins_format: str) -> str:
+    """
+    Format, filter and write the checkins of a state, as CheckinsPreProcess does with its raw data
+
+    Args:
+        state (str): State
+        checkins_df (pd.DataFrame): Raw checkins data of the state
+        metadata (dict): Metadata dictionary
+        checkins_format (str): Format of the intermediate checkins
+
+    Returns:
+        str: State
+    """
+    CheckinsPreProcess(state, metadata, checkins_format=checkins_format).process(checkins_df)
+
+    return state
+
+
+class StatesCheckinsPreProcess:
+    """
+    Checkins preprocessing of several states in one pass over the geo-joined Gowalla checkins
+
+    Args:
+        metadata (dict): Metadata dictionary
+        states (list[str] | None): States to preprocess, every state of the checkins if None
+        workers (int): Processes formatting and writing the states checkins
+        checkins_format (str): Format of the intermediate checkins, "csv" or "parquet"
+
+    Functions:
+        _read_checkins: Read the geo-joined checkins data
+        run: Run checkins preprocessing for every state
+    """
+
+    def __init__(self, metadata: dict, states: list[str] | None = None, workers: int = 1, checkins_format: str = "csv"):
+        self.metadata = metadata
+        self.states = states
+        self.workers = workers
+        self.checkins_format = checkins_format
+
+    def _read_checkins(self) -> pd.DataFrame:
+        """
+        Read the geo-joined checkins data, with the state of each checkin in the NAME column
+
+        Returns:
+            pd.DataFrame: Checkins data
+        """
+        checkins_df = pd.read_csv(
+            self.metadata["raw"]["geo_checkins"],
+            index_col=False,
+            usecols=["userid", "placeid", "datetime", "categoryid", "lat", "lng", "NAME"],
+        )
+        if self.states is not None:
+            checkins_df = checkins_df[checkins_df["NAME"].isin(self.states)]
+
+        return checkins_df
+
+    def run(self) -> None:
+        """
+        Run checkins preprocessing for every state: the checkins are split by state, in their original order,
+        and each state is formatted, filtered and written in parallel
+        """
+        checkins_df = self._read_checkins()
+        states_checkins = [
+            (state, state_df.drop(columns=["NAME"])) for state, state_df in checkins_df.groupby("NAME", sort=False)
+        ]
+        del checkins_df
+        logging.info(f"Preprocessing {len(states_checkins)} states")
+
+        if self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(_preprocess_state, state, state_df, self.metadata, self.checkins_format)
+                    for state, state_df in states_checkins
+                ]
+                for future in futures:
+                    logging.info(f"Preprocessed {future.result()} state")
+        else:
+            for state, state_df in states_checkins:
+                _preprocess_state(state, state_df, self.metadata, self.checkins_format)
+                logging.info(f"Preprocessed {state} state")
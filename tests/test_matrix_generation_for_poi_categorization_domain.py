@@ -0,0 +1,193 @@
+import csv
+import io
+import statistics as st
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from havana.model_preprocess.configuration.base_poi_categorization_configuration import (
+    BasePoiCategorizationConfiguration,
+)
+from havana.model_preprocess.domain.matrix_generation_for_poi_categorization_domain import (
+    MatrixGenerationForPoiCategorizationDomain,
+)
+from havana.model_preprocess.util.geospatial_utils import points_distance
+
+
+class RowsRecorder:
+    """
+    Stands for the csv loader, keeping the rows appended for each user
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def append(self, rows):
+        self.rows.append(rows)
+
+    def close(self):
+        pass
+
+
+def _baseline_user_rows(domain, user_checkin, userid):
+    """
+    Matrices rows of a user as written by the per-user loop the builder replaced
+    """
+    user_checkin = user_checkin.sort_values(by=["datetime"])
+    latitude_list = user_checkin["latitude"].tolist()
+    longitude_list = user_checkin["longitude"].tolist()
+    categories = [
+        domain.poi_categorization_configuration.GOWALLA_7_CATEGORIES_TO_INT[i] for i in user_checkin["category"]
+    ]
+    datetimes = user_checkin["datetime"].tolist()
+    placeids = user_checkin["placeid"].tolist()
+    placeids_unique = user_checkin["placeid"].unique().tolist()
+    placeids_unique_to_int = {placeids_unique[i]: i for i in range(len(placeids_unique))}
+    placeids_int = [placeids_unique_to_int[placeid] for placeid in placeids]
+
+    n_pois = len(placeids_unique)
+    adjacency_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
+    adjacency_weekday_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
+    adjacency_weekend_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
+    temporal_weekday_matrix = [[0 for i in range(24)] for j in range(n_pois)]
+    temporal_weekend_matrix = [[0 for i in range(24)] for j in range(n_pois)]
+    distance_matrix = [[0 for i in range(n_pois)] for j in range(n_pois)]
+    duration_matrix = [[[] for i in range(n_pois)] for j in range(n_pois)]
+    temporal_matrix = [[0 for i in range(48)] for j in range(n_pois)]
+    categories_list = [-1 for i in range(n_pois)]
+
+    if datetimes[0].weekday() < 5:
+        temporal_matrix[placeids_int[0]][datetimes[0].hour] += 1
+        temporal_weekday_matrix[placeids_int[0]][datetimes[0].hour] += 1
+    else:
+        temporal_matrix[placeids_int[0]][datetimes[0].hour + 24] += 1
+        temporal_weekend_matrix[placeids_int[0]][datetimes[0].hour] += 1
+    categories_list[0] = categories[0]
+
+    for j in range(1, len(datetimes)):
+        anterior = placeids_int[j - 1]
+        atual = placeids_int[j]
+        if distance_matrix[anterior][atual] == 0:
+            distance = int(
+                points_distance([latitude_list[j - 1], longitude_list[j - 1]], [latitude_list[j], longitude_list[j]])
+                / 1000
+            )
+            distance = domain._distance_importance(distance)
+        else:
+            distance = distance_matrix[anterior][atual]
+        duration = int((datetimes[j] - datetimes[j - 1]).total_seconds() / 3600)
+        duration = domain._duration_importance(duration)
+        distance_matrix[anterior][atual] = distance
+        distance_matrix[atual][anterior] = distance
+        duration_matrix[anterior][atual].append(duration)
+
+        adjacency_matrix[anterior][atual] += 1
+        adjacency_matrix[atual][anterior] += 1
+        if datetimes[j].weekday() < 5:
+            adjacency_weekday_matrix[anterior][atual] += 1
+            adjacency_weekday_matrix[atual][anterior] += 1
+            temporal_matrix[atual][datetimes[j].hour] += 1
+            temporal_weekday_matrix[atual][datetimes[j].hour] += 1
+        else:
+            adjacency_weekend_matrix[anterior][atual] += 1
+            adjacency_weekend_matrix[atual][anterior] += 1
+            temporal_matrix[atual][datetimes[j].hour + 24] += 1
+            temporal_weekend_matrix[atual][datetimes[j].hour] += 1
+        categories_list[atual] = categories[j]
+
+    adjacency_matrix, _, filtered_categories = domain.remove_gps_pois_that_dont_have_categories(
+        categories_list, adjacency_matrix, temporal_matrix
+    )
+    adjacency_weekday_matrix, _, _ = domain.remove_gps_pois_that_dont_have_categories(
+        categories_list, adjacency_weekday_matrix, temporal_weekday_matrix
+    )
+    adjacency_weekend_matrix, _, _ = domain.remove_gps_pois_that_dont_have_categories(
+        categories_list, adjacency_weekend_matrix, temporal_weekend_matrix
+    )
+    duration_matrix = [[st.median(values) if len(values) > 0 else 0 for values in row] for row in duration_matrix]
+
+    return [
+        [userid, adjacency_matrix, filtered_categories, placeids_unique],
+        [userid, adjacency_weekday_matrix, filtered_categories],
+        [userid, adjacency_weekend_matrix, filtered_categories],
+        [userid, temporal_matrix, filtered_categories],
+        [userid, temporal_weekday_matrix, filtered_categories],
+        [userid, temporal_weekend_matrix, filtered_categories],
+        [userid, distance_matrix, filtered_categories],
+        [userid, duration_matrix, filtered_categories],
+    ]
+
+
+@pytest.fixture
+def users_checkin():
+    random = np.random.default_rng(7)
+    categories = list(BasePoiCategorizationConfiguration().GOWALLA_7_CATEGORIES_TO_INT)
+    places = pd.DataFrame(
+        {
+            "placeid": np.arange(100, 130),
+            "latitude": random.uniform(40.0, 41.0, 30),
+            "longitude": random.uniform(-74.5, -73.5, 30),
+        }
+    )
+    users = []
+    for userid in range(1, 9):
+        n_checkins = int(random.integers(2, 40))
+        user_places = places.iloc[random.integers(0, 8 if userid % 2 else 30, n_checkins)].reset_index(drop=True)
+        # distinct datetimes, some of them a few minutes apart so consecutive durations repeat
+        minutes = np.sort(random.choice(60 * 24 * 30, n_checkins, replace=False))
+        users.append(
+            user_places.assign(
+                userid=userid,
+                datetime=pd.Timestamp("2010-06-01") + pd.to_timedelta(minutes, unit="min"),
+                category=random.choice(categories, n_checkins),
+            )
+        )
+
+    return pd.concat(users, ignore_index=True)
+
+
+def _csv_text(rows):
+    """
+    Rows as the csv loader writes them
+    """
+    text = io.StringIO()
+    csv.writer(text).writerows(rows)
+
+    return text.getvalue()
+
+
+def _assert_rows_equal(rows, baseline_rows):
+    assert len(rows) == len(baseline_rows) == 8
+    assert _csv_text(rows) == _csv_text(baseline_rows)
+
+
+def test_generate_user_matrices_matches_baseline_loop(users_checkin):
+    domain = MatrixGenerationForPoiCategorizationDomain("gowalla")
+    domain.csv_loader = RowsRecorder()
+
+    baseline_rows = []
+    for userid, user_checkin in users_checkin.groupby("userid"):
+        domain.generate_user_matrices(
+            user_checkin, userid, "datetime", "placeid", "category", "latitude", "longitude", [None] * 8
+        )
+        baseline_rows.append(_baseline_user_rows(domain, user_checkin, userid))
+
+    assert len(domain.csv_loader.rows) == len(baseline_rows)
+    for rows, user_baseline_rows in zip(domain.csv_loader.rows, baseline_rows):
+        _assert_rows_equal(rows, user_baseline_rows)
+
+
+def test_generate_users_matrices_columnar_matches_baseline_loop(users_checkin):
+    domain = MatrixGenerationForPoiCategorizationDomain("gowalla")
+    domain.csv_loader = RowsRecorder()
+    domain.generate_users_matrices_columnar(
+        users_checkin, "userid", "datetime", "placeid", "latitude", "longitude", [None] * 8
+    )
+
+    baseline_rows = [
+        _baseline_user_rows(domain, user_checkin, userid) for userid, user_checkin in users_checkin.groupby("userid")
+    ]
+    assert len(domain.csv_loader.rows) == len(baseline_rows)
+    for rows, user_baseline_rows in zip(domain.csv_loader.rows, baseline_rows):
+        _assert_rows_equal(rows, user_baseline_rows)
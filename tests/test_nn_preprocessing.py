@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+
+from havana.model.utils.nn_preprocessing import gcn_filter_batch, min_max_normalize_batch, normalized_adjacency_batch
+
+
+@pytest.fixture
+def adjacency():
+    random = np.random.default_rng(3)
+    adjacency = random.integers(0, 4, (6, 5, 5)).astype(float)
+    adjacency = adjacency + adjacency.transpose(0, 2, 1)
+    # a place without neighbours and a user without any
+    adjacency[1, 2, :] = 0
+    adjacency[1, :, 2] = 0
+    adjacency[4] = 0
+
+    return adjacency
+
+
+def test_normalized_adjacency_batch_matches_arma_preprocess(adjacency):
+    layers = pytest.importorskip("spektral.layers")
+    expected = np.array([layers.ARMAConv.preprocess(matrix.copy()) for matrix in adjacency])
+
+    np.testing.assert_allclose(normalized_adjacency_batch(adjacency), expected)
+
+
+def test_gcn_filter_batch_matches_gcn_preprocess(adjacency):
+    layers = pytest.importorskip("spektral.layers")
+    expected = np.array([layers.GCNConv.preprocess(matrix.copy()) for matrix in adjacency])
+
+    np.testing.assert_allclose(gcn_filter_batch(adjacency), expected)
+
+
+@pytest.fixture
+def temporal():
+    random = np.random.default_rng(5)
+    temporal = random.integers(0, 20, (4, 3, 48)).astype(float)
+    temporal[0, 1] = 7.0
+    temporal[1] = 0.0
+    temporal[2, 0] = 0.3 + np.arange(48) * 1e-17
+    temporal[2, 2] = 1e-3 * random.random(48)
+
+    return temporal
+
+
+def test_min_max_normalize_batch_matches_min_max_scaler(temporal):
+    # constant, all-zero, tiny-range and small-range rows
+    expected = np.array([MinMaxScaler().fit_transform(matrix.transpose()).transpose() for matrix in temporal])
+
+    np.testing.assert_allclose(min_max_normalize_batch(temporal), expected, rtol=0, atol=1e-12)